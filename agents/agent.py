@@ -1,61 +1,186 @@
-from langchain_openai import ChatOpenAI
+from functools import lru_cache
+from typing import List, Sequence
+
 from langchain.agents import create_agent
-from langsmith import traceable
+from langchain_core.runnables.config import get_executor_for_config
+from langchain_core.runnables.utils import gather_with_concurrency
+from utils.helpers.tracing import background_traceable
+from agents.cache import CachedAgent, PlanCache, tools_fingerprint
+from agents.llm import get_llm
+from agents.prompts import SYSTEM_PROMPT_CONFIG_KEY, configurable_system_prompt
+from agents.threads import CHECKPOINTER
 from tools.thinking import get_tools
 from utils.settings import (
-    OPENROUTER_API_KEY,
-    OPENROUTER_BASE_URL,
     LANGCHAIN_TRACING_V2,
     SYSTEM_PROMPTS,
 )
 
+# System prompts resolved once, falling back to the code interpreter prompt
+_PROMPTS = {
+    key: SYSTEM_PROMPTS.get(key, SYSTEM_PROMPTS["code_interpreter"])
+    for key in ("code_interpreter", "writer", "general_assistant")
+}
+
+# The tool set is fixed, so fingerprint it once
+_TOOLS_FP = tools_fingerprint(get_tools())
+
+# model_name arrives from API requests, so the caches are bounded rather than
+# growing with every distinct name a client sends
+_AGENT_CACHE_SIZE = 16
+
+
+@lru_cache(maxsize=_AGENT_CACHE_SIZE)
+def _get_base_agent(model_name: str, use_checkpointer: bool = False):
+    """
+    Compile the agent graph once per model (and checkpointer setting).
+
+    The system prompt is read from the run config, so every prompt variant
+    shares this graph. Checkpointed graphs share one bounded saver, so a
+    chat's thread survives a model switch.
+    """
+    # Create agent without checkpointer by default (for LangGraph Studio compatibility)
+    return create_agent(
+        get_llm(model_name, 0.7),
+        get_tools(),
+        middleware=[configurable_system_prompt(_PROMPTS["code_interpreter"])],
+        checkpointer=CHECKPOINTER if use_checkpointer else None,
+    )
+
 
-@traceable(name="agent_executor", tags=["agent", "lang-chain-mc"])
-def get_agent_executor(model_name: str, system_prompt_key: str = "code_interpreter", use_checkpointer: bool = False):
+@lru_cache(maxsize=_AGENT_CACHE_SIZE)
+@background_traceable(name="agent_executor", tags=["agent", "lang-chain-mc"])
+def get_agent_executor(
+        model_name: str,
+        system_prompt_key: str = "code_interpreter",
+        use_checkpointer: bool = False,
+        use_plan_cache: bool = False,
+        enable_parallel_tool_execution: bool = True,
+        max_tool_concurrency: int = 8
+):
     """
     Creates and returns a LangGraph agent with LangSmith tracing enabled.
 
+    Agents are cached per argument combination, so request handlers can call
+    this on every request. Compiled graphs are safe to share across threads;
+    per-conversation state lives in the checkpointer, keyed by thread_id.
+    Variants that differ only in system prompt are config-bound views over
+    one compiled graph per model.
+
     Args:
         model_name: The model name to use for the LLM
         system_prompt_key: Key for system prompt from system_prompts.json
                           Options: "code_interpreter", "writer", "general_assistant"
-        use_checkpointer: Whether to use a checkpointer (only for local FastAPI, not for LangGraph Studio)
+        use_checkpointer: Keep per-thread state in an in-process checkpointer, so callers can
+                          send only new messages (only for local FastAPI, not for LangGraph Studio)
+        use_plan_cache: Wrap the agent in a CachedAgent that replays cached tool
+                        calls for repeated queries (not a graph, so not for LangGraph Studio)
+        enable_parallel_tool_execution: Run the tool calls of one model turn concurrently
+        max_tool_concurrency: Upper bound on concurrently running tool calls
 
     Returns:
         The agent executor with tools and optional checkpointer
     """
-    if not OPENROUTER_API_KEY:
-        raise ValueError("OPENROUTER_API_KEY is missing!")
-    if not OPENROUTER_BASE_URL:
-        raise ValueError("OPENROUTER_BASE_URL is missing!")
-
-    llm = ChatOpenAI(
-        model=model_name,
-        api_key=OPENROUTER_API_KEY,
-        base_url=OPENROUTER_BASE_URL,
-        temperature=0.7,
-        metadata={
-            "langsmith_project": "lang-chain-mc",
-            "model_name": model_name,
-        }
-    )
-
     tools = get_tools()
 
     # Get system prompt from JSON
-    system_prompt = SYSTEM_PROMPTS.get(system_prompt_key, SYSTEM_PROMPTS["code_interpreter"])
+    system_prompt = _PROMPTS.get(system_prompt_key, _PROMPTS["code_interpreter"])
 
-    # Create agent without checkpointer by default (for LangGraph Studio compatibility)
-    agent = create_agent(
-        llm,
-        tools,
-        system_prompt=system_prompt,
-    )
+    # A view over the shared graph; only the bound config differs per variant.
+    # create_agent fans every tool call of a turn out as its own task in the
+    # same superstep; max_concurrency bounds the executor running them.
+    agent = _get_base_agent(model_name, use_checkpointer).with_config({
+        "configurable": {SYSTEM_PROMPT_CONFIG_KEY: system_prompt},
+        "max_concurrency": max_tool_concurrency if enable_parallel_tool_execution else 1,
+        # Exposed as agent.config["metadata"]["tools_fingerprint"] for cache keys
+        "metadata": {"tools_fingerprint": _TOOLS_FP},
+    })
+
+    if use_plan_cache:
+        agent = CachedAgent(
+            agent,
+            cache=PlanCache(namespace=system_prompt_key, ttl=7 * 86400, max_mb=100),
+            model_name=model_name,
+            system_prompt=system_prompt,
+            tools=tools,
+            tools_fp=_TOOLS_FP,
+        )
 
     return agent
 
 
-# Dynamic agent instance (visible in LangSmith)
-dynamic_agent_executor = get_agent_executor("gpt-4.1", "code_interpreter")
-writer_executor_agent = get_agent_executor("gpt-4.1", "writer")
-agent_executor = get_agent_executor("gpt-4.1", "general_assistant")
\ No newline at end of file
+def run_batch(
+        inputs: Sequence[dict],
+        model_name: str = "gpt-4.1",
+        system_prompt_key: str = "code_interpreter",
+        max_concurrency: int = 10,
+        return_exceptions: bool = False,
+        use_plan_cache: bool = False
+) -> List[dict]:
+    """
+    Run the agent over many inputs concurrently.
+
+    The batch width is bounded here rather than through the call config,
+    which would override the agent's max_tool_concurrency inside every item.
+
+    Args:
+        inputs: Agent inputs, e.g. [{"messages": [("user", "...")]}, ...]
+        model_name: The model name to use for the LLM
+        system_prompt_key: Key for system prompt from system_prompts.json
+        max_concurrency: Maximum number of inputs in flight at once
+        return_exceptions: Return exceptions in place of failed results instead of raising
+        use_plan_cache: Answer inputs seen before from the plan cache (replaying their tool calls)
+
+    Returns:
+        Agent results in the same order as inputs
+    """
+    agent = get_agent_executor(model_name, system_prompt_key, use_plan_cache=use_plan_cache)
+
+    def run(item: dict):
+        try:
+            return agent.invoke(item)
+        except Exception as e:
+            if return_exceptions:
+                return e
+            raise
+
+    # Context-copying executor, so traces still nest under the caller
+    with get_executor_for_config({"max_concurrency": max_concurrency}) as executor:
+        return list(executor.map(run, list(inputs)))
+
+
+async def run_batch_async(
+        inputs: Sequence[dict],
+        model_name: str = "gpt-4.1",
+        system_prompt_key: str = "code_interpreter",
+        max_concurrency: int = 10,
+        return_exceptions: bool = False,
+        use_plan_cache: bool = False
+) -> List[dict]:
+    """Async variant of run_batch, running the inputs on the event loop"""
+    agent = get_agent_executor(model_name, system_prompt_key, use_plan_cache=use_plan_cache)
+
+    async def run(item: dict):
+        try:
+            return await agent.ainvoke(item)
+        except Exception as e:
+            if return_exceptions:
+                return e
+            raise
+
+    return await gather_with_concurrency(max_concurrency, *(run(item) for item in inputs))
+
+
+# Pre-configured agent instances (visible in LangSmith / LangGraph Studio).
+# Built lazily on first attribute access (PEP 562) so importing this module
+# doesn't construct agents that are never used.
+_PRECONFIGURED_AGENTS = {
+    "dynamic_agent_executor": ("gpt-4.1", "code_interpreter"),
+    "writer_executor_agent": ("gpt-4.1", "writer"),
+    "agent_executor": ("gpt-4.1", "general_assistant"),
+}
+
+
+def __getattr__(name: str):
+    if name in _PRECONFIGURED_AGENTS:
+        return get_agent_executor(*_PRECONFIGURED_AGENTS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
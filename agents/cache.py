@@ -0,0 +1,328 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    ToolMessage,
+    convert_to_messages,
+    messages_from_dict,
+    messages_to_dict,
+)
+from langchain_core.runnables.config import get_config_list, get_executor_for_config
+from langchain_core.runnables.utils import gather_with_concurrency
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+logger = logging.getLogger(__name__)
+
+
+class PlanCache:
+    """
+    Persistent cache of successful agent traces, keyed by SHA-256 fingerprint.
+
+    Entries live in the ``agent_cache`` table of the application database.
+    Cache failures are logged and treated as misses so they never break an
+    agent run.
+    """
+
+    def __init__(self, namespace: str = "agent", ttl: int = 7 * 86400, max_mb: int = 100):
+        """
+        Args:
+            namespace: Key prefix separating caches of different agents
+            ttl: Entry lifetime in seconds
+            max_mb: Size budget for this namespace in megabytes
+        """
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_bytes = max_mb * 1024 * 1024
+
+    def make_key(self, *parts: str) -> str:
+        """Build a namespaced SHA-256 key from the given parts"""
+        digest = hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+        return f"{self.namespace}:{digest}"
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached payload for key, or None on miss/expiry"""
+        from database.db import db_manager
+
+        try:
+            return db_manager.get_cache_entry(key, self.ttl)
+        except Exception as e:
+            logger.warning("Plan cache lookup failed: %s", e)
+            return None
+
+    def put(self, key: str, payload: dict) -> None:
+        """Store payload under key and prune the namespace to its size budget"""
+        from database.db import db_manager
+
+        try:
+            size_bytes = len(json.dumps(payload, default=str).encode("utf-8"))
+            db_manager.save_cache_entry(key, payload, size_bytes)
+            db_manager.prune_cache(self.max_bytes, key_prefix=f"{self.namespace}:")
+        except Exception as e:
+            logger.warning("Plan cache write failed: %s", e)
+
+
+def _content_fingerprint(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    return json.dumps(content, sort_keys=True, default=str)
+
+
+def tools_fingerprint(tools: Sequence) -> str:
+    """
+    Stable fingerprint of a tool set: names and argument schemas, as the
+    model sees them. Any tool signature change invalidates cached plans.
+    """
+    schemas = sorted(json.dumps(convert_to_openai_tool(tool), sort_keys=True) for tool in tools)
+    return hashlib.sha256("|".join(schemas).encode("utf-8")).hexdigest()[:16]
+
+
+class CachedAgent:
+    """
+    Thin wrapper that answers repeated queries from a PlanCache.
+
+    The cache key covers the model, system prompt, tool set and the full input
+    conversation. On a hit the cached tool calls are replayed against the live
+    tools (so side effects such as workspace files happen again) and the cached
+    model messages are reused, skipping every LLM round trip. A replay that
+    references an unknown tool, produces a tool error or returns output other
+    than the cached result falls back to a normal run.
+
+    With ``replay_tools=False`` nothing is executed on a hit: the cached trace
+    is returned as is. Pair it with ``state``, a function that snapshots the
+    external state a trace depends on (e.g. hashes of the files it touched);
+    the snapshot is stored with the trace and a hit only counts while the
+    live snapshot still matches it.
+
+    ``invoke``/``ainvoke``, ``batch``/``abatch`` and
+    ``stream``/``astream(stream_mode="updates")`` go through the cache; any
+    other attribute is delegated to the wrapped agent unchanged.
+    """
+
+    def __init__(
+            self,
+            agent,
+            cache: PlanCache,
+            model_name: str,
+            system_prompt: str,
+            tools: Sequence,
+            tools_fp: Optional[str] = None,
+            replay_tools: bool = True,
+            state: Optional[Callable[[List[BaseMessage]], dict]] = None
+    ):
+        self.agent = agent
+        self.cache = cache
+        self.model_name = model_name
+        self.system_prompt = system_prompt
+        self.tools = {tool.name: tool for tool in tools}
+        self.tools_fp = tools_fp or tools_fingerprint(tools)
+        self.replay_tools = replay_tools
+        self.state = state
+
+    def __getattr__(self, name: str):
+        return getattr(self.agent, name)
+
+    # ==================== Cache Keys ====================
+
+    @staticmethod
+    def _input_messages(inputs: dict) -> List[BaseMessage]:
+        return convert_to_messages(inputs.get("messages", []))
+
+    def _key(self, messages: List[BaseMessage]) -> str:
+        conversation = json.dumps(
+            [(message.type, _content_fingerprint(message.content)) for message in messages]
+        )
+        return self.cache.make_key(self.model_name, self.system_prompt, self.tools_fp, conversation)
+
+    # ==================== Replay / Store ====================
+
+    def _replay(self, payload: dict) -> Optional[List[BaseMessage]]:
+        """Re-run cached tool calls; returns the new messages or None if the plan is unusable"""
+        try:
+            cached = messages_from_dict(payload["messages"])
+        except Exception as e:
+            logger.warning("Discarding unreadable plan cache entry: %s", e)
+            return None
+
+        if self.state is not None and self.state(cached) != payload.get("state"):
+            # The world moved on since this trace ran
+            return None
+        if not self.replay_tools:
+            return cached
+
+        cached_results = {
+            message.tool_call_id: _content_fingerprint(message.content)
+            for message in cached
+            if isinstance(message, ToolMessage)
+        }
+        replayed = []
+        for message in cached:
+            if isinstance(message, ToolMessage):
+                # Replaced by the fresh results of the preceding AIMessage
+                continue
+            replayed.append(message)
+            if not isinstance(message, AIMessage):
+                continue
+            for tool_call in message.tool_calls:
+                tool = self.tools.get(tool_call["name"])
+                if tool is None:
+                    return None
+                try:
+                    result = tool.invoke({**tool_call, "type": "tool_call"})
+                except Exception as e:
+                    logger.info("Plan replay failed on %s: %s", tool_call["name"], e)
+                    return None
+                if getattr(result, "status", "success") == "error":
+                    return None
+                if _content_fingerprint(result.content) != cached_results.get(tool_call["id"]):
+                    # The cached answer was written for the old output
+                    logger.info("Plan replay diverged on %s", tool_call["name"])
+                    return None
+                replayed.append(result)
+        return replayed
+
+    def _store(self, key: str, new_messages: List[BaseMessage]) -> None:
+        """Cache a finished trace (last message is a final AI answer)"""
+        if not new_messages:
+            return
+        final = new_messages[-1]
+        if not isinstance(final, AIMessage) or final.tool_calls:
+            return
+        payload = {"messages": messages_to_dict(new_messages)}
+        if self.state is not None:
+            payload["state"] = self.state(new_messages)
+        self.cache.put(key, payload)
+
+    def _lookup(self, inputs: dict) -> Tuple[List[BaseMessage], str, Optional[List[BaseMessage]]]:
+        """Input messages, cache key and the replayed messages (None on miss)"""
+        messages = self._input_messages(inputs)
+        key = self._key(messages)
+
+        payload = self.cache.get(key)
+        replayed = self._replay(payload) if payload is not None else None
+        return messages, key, replayed
+
+    @staticmethod
+    def _as_updates(replayed: List[BaseMessage]) -> Iterator[dict]:
+        # Mirror create_agent's node names so consumers can't tell the difference
+        for message in replayed:
+            node = "tools" if isinstance(message, ToolMessage) else "model"
+            yield {node: {"messages": [message]}}
+
+    @staticmethod
+    def _update_messages(event: dict) -> List[BaseMessage]:
+        new_messages = []
+        for update in event.values():
+            if isinstance(update, dict):
+                new_messages.extend(update.get("messages", []))
+        return new_messages
+
+    # ==================== Runnable API ====================
+
+    def invoke(self, inputs: dict, config: Optional[dict] = None, **kwargs) -> dict:
+        messages, key, replayed = self._lookup(inputs)
+        if replayed is not None:
+            return {**inputs, "messages": messages + replayed}
+
+        result = self.agent.invoke(inputs, config, **kwargs)
+        self._store(key, result.get("messages", [])[len(messages):])
+        return result
+
+    async def ainvoke(self, inputs: dict, config: Optional[dict] = None, **kwargs) -> dict:
+        # Lookup and replay are blocking (DB, tools), so keep them off the event loop
+        messages, key, replayed = await asyncio.to_thread(self._lookup, inputs)
+        if replayed is not None:
+            return {**inputs, "messages": messages + replayed}
+
+        result = await self.agent.ainvoke(inputs, config, **kwargs)
+        await asyncio.to_thread(self._store, key, result.get("messages", [])[len(messages):])
+        return result
+
+    def batch(
+            self,
+            inputs: List[dict],
+            config: Optional[dict] = None,
+            *,
+            return_exceptions: bool = False,
+            **kwargs
+    ) -> List[Any]:
+        if not inputs:
+            return []
+        configs = get_config_list(config, len(inputs))
+
+        def run(item: dict, item_config: dict):
+            try:
+                return self.invoke(item, item_config, **kwargs)
+            except Exception as e:
+                if return_exceptions:
+                    return e
+                raise
+
+        # Same executor (and max_concurrency bound) Runnable.batch uses
+        with get_executor_for_config(configs[0]) as executor:
+            return list(executor.map(run, inputs, configs))
+
+    async def abatch(
+            self,
+            inputs: List[dict],
+            config: Optional[dict] = None,
+            *,
+            return_exceptions: bool = False,
+            **kwargs
+    ) -> List[Any]:
+        if not inputs:
+            return []
+        configs = get_config_list(config, len(inputs))
+
+        async def run(item: dict, item_config: dict):
+            try:
+                return await self.ainvoke(item, item_config, **kwargs)
+            except Exception as e:
+                if return_exceptions:
+                    return e
+                raise
+
+        return await gather_with_concurrency(
+            configs[0].get("max_concurrency"),
+            *(run(item, item_config) for item, item_config in zip(inputs, configs)),
+        )
+
+    def stream(self, inputs: dict, config: Optional[dict] = None, stream_mode: str = "updates", **kwargs) -> Iterator:
+        if stream_mode != "updates":
+            yield from self.agent.stream(inputs, config, stream_mode=stream_mode, **kwargs)
+            return
+
+        _, key, replayed = self._lookup(inputs)
+        if replayed is not None:
+            yield from self._as_updates(replayed)
+            return
+
+        new_messages = []
+        for event in self.agent.stream(inputs, config, stream_mode=stream_mode, **kwargs):
+            new_messages.extend(self._update_messages(event))
+            yield event
+        self._store(key, new_messages)
+
+    async def astream(
+            self, inputs: dict, config: Optional[dict] = None, stream_mode: str = "updates", **kwargs
+    ) -> AsyncIterator:
+        if stream_mode != "updates":
+            async for event in self.agent.astream(inputs, config, stream_mode=stream_mode, **kwargs):
+                yield event
+            return
+
+        _, key, replayed = await asyncio.to_thread(self._lookup, inputs)
+        if replayed is not None:
+            for event in self._as_updates(replayed):
+                yield event
+            return
+
+        new_messages = []
+        async for event in self.agent.astream(inputs, config, stream_mode=stream_mode, **kwargs):
+            new_messages.extend(self._update_messages(event))
+            yield event
+        await asyncio.to_thread(self._store, key, new_messages)
@@ -1,19 +1,89 @@
 """
 File management agents for creating and editing files in the workspace.
 """
-from langchain_openai import ChatOpenAI
+import hashlib
+from functools import lru_cache
+from typing import Dict, List, Optional
+
 from langchain.agents import create_agent
-from langsmith import traceable
+from langchain_core.messages import AIMessage, BaseMessage
+from utils.helpers.tracing import background_traceable
+from agents.cache import CachedAgent, PlanCache, tools_fingerprint
+from agents.llm import get_llm
+from agents.prompts import SYSTEM_PROMPT_CONFIG_KEY, configurable_system_prompt
 from tools.file_tools import get_file_tools
-from utils.settings import (
-    OPENROUTER_API_KEY,
-    OPENROUTER_BASE_URL,
-    SYSTEM_PROMPTS,
-)
+from utils.settings import SYSTEM_PROMPTS, WORKSPACE_DIR
+
+# System prompts resolved once, falling back to the general assistant prompt
+_PROMPTS = {
+    key: SYSTEM_PROMPTS.get(key, SYSTEM_PROMPTS["general_assistant"])
+    for key in ("file_creator", "file_editor")
+}
+
+# The file tool set is fixed, so fingerprint it once
+_TOOLS_FP = tools_fingerprint(get_file_tools())
+
+# Workspace contents drift, so cached file plans expire sooner than chat plans
+_PLAN_CACHE_TTL = 24 * 3600
+
+# One entry per (model, plan cache) combination; bounded like the chat agents
+_AGENT_CACHE_SIZE = 16
+
+
+@lru_cache(maxsize=_AGENT_CACHE_SIZE)
+def _get_base_agent(model_name: str):
+    """
+    Compile the file agent graph once per model.
+
+    Creation and editing agents share tools and model and differ only in
+    system prompt, which is read from the run config. The compiled graph
+    keeps no per-run state, so one instance serves concurrent requests.
+    """
+    return create_agent(
+        get_llm(model_name, 0),
+        get_file_tools(),
+        middleware=[configurable_system_prompt(SYSTEM_PROMPTS["general_assistant"])],
+    )
+
+
+def _file_digest(filename: str) -> Optional[str]:
+    try:
+        return hashlib.sha256((WORKSPACE_DIR / filename).read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def _workspace_state(messages: List[BaseMessage]) -> Dict[str, Optional[str]]:
+    """Content hash of every workspace file the trace's tool calls named (None: missing)"""
+    filenames = {
+        tool_call["args"]["filename"]
+        for message in messages
+        if isinstance(message, AIMessage)
+        for tool_call in message.tool_calls
+        if isinstance(tool_call.get("args", {}).get("filename"), str)
+    }
+    return {filename: _file_digest(filename) for filename in sorted(filenames)}
+
+
+def _with_plan_cache(agent, namespace: str, model_name: str, system_prompt: str) -> CachedAgent:
+    # File writes are not idempotent (appends, overwrites of newer edits), so
+    # a hit returns the cached answer without running any tool, and only while
+    # the files the run touched are exactly as it left them
+    return CachedAgent(
+        agent,
+        cache=PlanCache(namespace=namespace, ttl=_PLAN_CACHE_TTL, max_mb=100),
+        model_name=model_name,
+        system_prompt=system_prompt,
+        tools=get_file_tools(),
+        tools_fp=_TOOLS_FP,
+        replay_tools=False,
+        state=_workspace_state,
+    )
 
 
-@traceable(name="file_creation_agent", tags=["file-agent", "file-creation", "lang-chain-mc"])
-def get_file_creation_agent(model_name: str = "gpt-4o-mini"):
+@lru_cache(maxsize=_AGENT_CACHE_SIZE)
+@background_traceable(name="file_creation_agent", tags=["file-agent", "file-creation", "lang-chain-mc"])
+def get_file_creation_agent(model_name: str = "gpt-4o-mini", use_plan_cache: bool = False):
     """
     Creates and returns a LangGraph agent specialized for file creation.
     
@@ -22,44 +92,30 @@ def get_file_creation_agent(model_name: str = "gpt-4o-mini"):
     
     Args:
         model_name: The model name to use for the LLM (default: "gpt-4o-mini")
+        use_plan_cache: Answer repeated tasks from a PlanCache without LLM or tool
+                        calls, while the files the cached run touched are unchanged
     
     Returns:
         The agent executor with file creation tools
     """
-    if not OPENROUTER_API_KEY:
-        raise ValueError("OPENROUTER_API_KEY is missing!")
-    if not OPENROUTER_BASE_URL:
-        raise ValueError("OPENROUTER_BASE_URL is missing!")
-
-    llm = ChatOpenAI(
-        model=model_name,
-        api_key=OPENROUTER_API_KEY,
-        base_url=OPENROUTER_BASE_URL,
-        temperature=0,
-        metadata={
-            "langsmith_project": "lang-chain-mc",
-            "model_name": model_name,
-            "agent_type": "file_creation",
-        }
-    )
-
-    tools = get_file_tools()
-
     # Get system prompt for file creator
-    system_prompt = SYSTEM_PROMPTS.get("file_creator", SYSTEM_PROMPTS["general_assistant"])
+    system_prompt = _PROMPTS["file_creator"]
 
-    # Create agent
-    agent = create_agent(
-        llm,
-        tools,
-        system_prompt=system_prompt,
-    )
+    # Bind the prompt and tag the agent rather than the (shared) LLM client
+    agent = _get_base_agent(model_name).with_config({
+        "configurable": {SYSTEM_PROMPT_CONFIG_KEY: system_prompt},
+        "metadata": {"agent_type": "file_creation", "tools_fingerprint": _TOOLS_FP},
+    })
+
+    if use_plan_cache:
+        agent = _with_plan_cache(agent, "file_creator", model_name, system_prompt)
 
     return agent
 
 
-@traceable(name="file_editing_agent", tags=["file-agent", "file-editing", "lang-chain-mc"])
-def get_file_editing_agent(model_name: str = "gpt-4o-mini"):
+@lru_cache(maxsize=_AGENT_CACHE_SIZE)
+@background_traceable(name="file_editing_agent", tags=["file-agent", "file-editing", "lang-chain-mc"])
+def get_file_editing_agent(model_name: str = "gpt-4o-mini", use_plan_cache: bool = False):
     """
     Creates and returns a LangGraph agent specialized for file editing.
     
@@ -68,42 +124,36 @@ def get_file_editing_agent(model_name: str = "gpt-4o-mini"):
     
     Args:
         model_name: The model name to use for the LLM (default: "gpt-4o-mini")
+        use_plan_cache: Answer repeated tasks from a PlanCache without LLM or tool
+                        calls, while the files the cached run touched are unchanged
     
     Returns:
         The agent executor with file editing tools
     """
-    if not OPENROUTER_API_KEY:
-        raise ValueError("OPENROUTER_API_KEY is missing!")
-    if not OPENROUTER_BASE_URL:
-        raise ValueError("OPENROUTER_BASE_URL is missing!")
-
-    llm = ChatOpenAI(
-        model=model_name,
-        api_key=OPENROUTER_API_KEY,
-        base_url=OPENROUTER_BASE_URL,
-        temperature=0,
-        metadata={
-            "langsmith_project": "lang-chain-mc",
-            "model_name": model_name,
-            "agent_type": "file_editing",
-        }
-    )
-
-    tools = get_file_tools()
-
     # Get system prompt for file editor
-    system_prompt = SYSTEM_PROMPTS.get("file_editor", SYSTEM_PROMPTS["general_assistant"])
+    system_prompt = _PROMPTS["file_editor"]
 
-    # Create agent
-    agent = create_agent(
-        llm,
-        tools,
-        system_prompt=system_prompt,
-    )
+    # Bind the prompt and tag the agent rather than the (shared) LLM client
+    agent = _get_base_agent(model_name).with_config({
+        "configurable": {SYSTEM_PROMPT_CONFIG_KEY: system_prompt},
+        "metadata": {"agent_type": "file_editing", "tools_fingerprint": _TOOLS_FP},
+    })
+
+    if use_plan_cache:
+        agent = _with_plan_cache(agent, "file_editor", model_name, system_prompt)
 
     return agent
 
 
-# Pre-configured agent instances (for LangGraph Studio)
-file_creation_agent_executor = get_file_creation_agent("gpt-4o-mini")
-file_editing_agent_executor = get_file_editing_agent("gpt-4o-mini")
+# Pre-configured agent instances (for LangGraph Studio), built on first access
+_PRECONFIGURED_AGENTS = {
+    "file_creation_agent_executor": (get_file_creation_agent, "gpt-4o-mini"),
+    "file_editing_agent_executor": (get_file_editing_agent, "gpt-4o-mini"),
+}
+
+
+def __getattr__(name: str):
+    if name in _PRECONFIGURED_AGENTS:
+        factory, model_name = _PRECONFIGURED_AGENTS[name]
+        return factory(model_name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
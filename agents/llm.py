@@ -0,0 +1,44 @@
+"""
+Shared chat model clients for all agents.
+"""
+from functools import lru_cache
+
+from langchain_openai import ChatOpenAI
+
+from utils.settings import (
+    OPENROUTER_API_KEY,
+    OPENROUTER_BASE_URL,
+)
+
+
+@lru_cache(maxsize=8)
+def get_llm(model_name: str, temperature: float) -> ChatOpenAI:
+    """
+    Returns a ChatOpenAI client for the given model and temperature.
+
+    Clients are cached so every agent using the same model/temperature
+    shares one HTTP client and connection pool. Agent-specific LangSmith
+    metadata should be attached to the agent via `with_config`, not here.
+
+    Args:
+        model_name: The OpenRouter model name
+        temperature: Sampling temperature
+
+    Returns:
+        The shared ChatOpenAI client
+    """
+    if not OPENROUTER_API_KEY:
+        raise ValueError("OPENROUTER_API_KEY is missing!")
+    if not OPENROUTER_BASE_URL:
+        raise ValueError("OPENROUTER_BASE_URL is missing!")
+
+    return ChatOpenAI(
+        model=model_name,
+        api_key=OPENROUTER_API_KEY,
+        base_url=OPENROUTER_BASE_URL,
+        temperature=temperature,
+        metadata={
+            "langsmith_project": "lang-chain-mc",
+            "model_name": model_name,
+        }
+    )
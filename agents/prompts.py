@@ -0,0 +1,25 @@
+"""
+Runtime-configurable system prompts, so one compiled agent graph can serve
+several prompt variants.
+"""
+from langchain.agents.middleware import ModelRequest, dynamic_prompt
+from langgraph.config import get_config
+
+SYSTEM_PROMPT_CONFIG_KEY = "system_prompt"
+
+
+def configurable_system_prompt(default: str):
+    """
+    Build a middleware that reads the system prompt from
+    `config["configurable"]["system_prompt"]`, falling back to `default`.
+
+    Bind a variant with:
+        agent.with_config({"configurable": {"system_prompt": prompt}})
+    """
+
+    @dynamic_prompt
+    def system_prompt_from_config(request: ModelRequest) -> str:
+        configurable = get_config().get("configurable", {})
+        return configurable.get(SYSTEM_PROMPT_CONFIG_KEY, default)
+
+    return system_prompt_from_config
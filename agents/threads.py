@@ -0,0 +1,75 @@
+"""
+In-process checkpointer threads for the chat routes, kept in step with the
+persisted chat history.
+"""
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+# Threads kept in memory; the least recently used are dropped beyond this
+_MAX_THREADS = 1000
+
+
+class ThreadSync:
+    """
+    Tracks which checkpointer threads mirror their persisted chat.
+
+    A thread is current at the chat revision recorded after its last fully
+    persisted turn; any other change to the chat (an edit, a delete, a turn
+    served by another worker, an aborted run) moves the revision on and the
+    thread is rebuilt from the database. Memory stays bounded: synced
+    threads are compacted to their latest checkpoint, and the least recently
+    used threads are deleted once more than `max_threads` are held.
+    """
+
+    def __init__(self, checkpointer: InMemorySaver, max_threads: int = _MAX_THREADS):
+        self.checkpointer = checkpointer
+        self.max_threads = max_threads
+        # thread_id -> chat revision the thread mirrors (None: not in step)
+        self._revisions: "OrderedDict[str, Optional[int]]" = OrderedDict()
+        self._lock = Lock()
+
+    def is_current(self, thread_id: str, revision: Optional[int]) -> bool:
+        """Whether the thread holds exactly the chat as of `revision`"""
+        with self._lock:
+            synced = self._revisions.pop(thread_id, None)
+            # Touch: every thread used this turn is kept, in step or not
+            self._revisions[thread_id] = synced
+            evicted = []
+            while len(self._revisions) > self.max_threads:
+                evicted.append(self._revisions.popitem(last=False)[0])
+
+        for old_thread_id in evicted:
+            self.checkpointer.delete_thread(old_thread_id)
+        return revision is not None and synced == revision
+
+    def mark_synced(self, thread_id: str, base_revision: Optional[int], revision: Optional[int]) -> None:
+        """
+        Record a finished turn that started at `base_revision` and persisted
+        its messages as `revision`. Only a turn with no other write in
+        between leaves the thread in step.
+        """
+        in_step = None not in (base_revision, revision) and revision == base_revision + 1
+        with self._lock:
+            if thread_id in self._revisions:
+                self._revisions[thread_id] = revision if in_step else None
+        if in_step:
+            self._compact(thread_id)
+
+    def _compact(self, thread_id: str) -> None:
+        """Keep only the latest checkpoint; the saver otherwise keeps every step"""
+        config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+        latest = self.checkpointer.get_tuple(config)
+        if latest is None:
+            return
+        self.checkpointer.delete_thread(thread_id)
+        self.checkpointer.put(
+            config, latest.checkpoint, latest.metadata, latest.checkpoint["channel_versions"]
+        )
+
+
+# Shared by every chat agent graph; threads are keyed "<user_id>:<chat_id>"
+CHECKPOINTER = InMemorySaver()
+CHAT_THREADS = ThreadSync(CHECKPOINTER)
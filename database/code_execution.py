@@ -1,11 +1,28 @@
 from typing import List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from datetime import datetime, timedelta
+from sqlalchemy import Integer, bindparam, desc, func, insert, select
+from datetime import datetime, timedelta, timezone
 
 from database.models.code_execution_models import CodeExecution, WorkspaceFileMetadata
 from schemas.code_execution_schemas import CodeExecutionResult, WorkspaceFile
 
+# Per-session lookups are built once with bind parameters and reused per call
+_SEL_SESSION_HISTORY = (
+    select(CodeExecution)
+    .where(CodeExecution.session_id == bindparam("sid"))
+    .order_by(desc(CodeExecution.created_at))
+    .limit(bindparam("lim", type_=Integer))
+)
+_SEL_SESSION_FILES = (
+    select(WorkspaceFileMetadata)
+    .where(WorkspaceFileMetadata.session_id == bindparam("sid"))
+    .order_by(desc(WorkspaceFileMetadata.created_at))
+)
+_COUNT_SESSION_FILES = (
+    select(func.count(WorkspaceFileMetadata.id))
+    .where(WorkspaceFileMetadata.session_id == bindparam("sid"))
+)
+
 
 class ExecutionRepository:
     """Repository for code execution operations"""
@@ -34,8 +51,8 @@ class ExecutionRepository:
             execution_time=execution_time
         )
         db.add(execution)
+        db.flush()
         db.commit()
-        db.refresh(execution)
         return execution
     
     @staticmethod
@@ -45,12 +62,7 @@ class ExecutionRepository:
         limit: int = 50
     ) -> List[CodeExecution]:
         """Get execution history for a session"""
-        result = db.query(CodeExecution)\
-            .filter(CodeExecution.session_id == session_id)\
-            .order_by(desc(CodeExecution.created_at))\
-            .limit(limit)\
-            .all()
-        return result
+        return list(db.execute(_SEL_SESSION_HISTORY, {"sid": session_id, "lim": limit}).scalars())
     
     @staticmethod
     def get_recent_executions(
@@ -59,7 +71,7 @@ class ExecutionRepository:
         limit: int = 100
     ) -> List[CodeExecution]:
         """Get recent executions across all sessions"""
-        since = datetime.utcnow() - timedelta(hours=hours)
+        since = datetime.now(timezone.utc) - timedelta(hours=hours)
         result = db.query(CodeExecution)\
             .filter(CodeExecution.created_at >= since)\
             .order_by(desc(CodeExecution.created_at))\
@@ -93,9 +105,25 @@ class WorkspaceRepository:
             execution_id=execution_id
         )
         db.add(file_meta)
+        db.flush()
         db.commit()
-        db.refresh(file_meta)
         return file_meta
+
+    @staticmethod
+    def save_file_metadata_bulk(
+        db: Session,
+        rows: List[dict]
+    ) -> List[int]:
+        """
+        Save metadata for several workspace files with one executemany
+        INSERT and a single commit; returns the IDs in the order of `rows`
+        """
+        if not rows:
+            return []
+        stmt = insert(WorkspaceFileMetadata).returning(WorkspaceFileMetadata.id, sort_by_parameter_order=True)
+        ids = list(db.execute(stmt, rows).scalars())
+        db.commit()
+        return ids
     
     @staticmethod
     def get_session_files(
@@ -103,11 +131,15 @@ class WorkspaceRepository:
         session_id: str
     ) -> List[WorkspaceFileMetadata]:
         """Get all files for a session"""
-        result = db.query(WorkspaceFileMetadata)\
-            .filter(WorkspaceFileMetadata.session_id == session_id)\
-            .order_by(desc(WorkspaceFileMetadata.created_at))\
-            .all()
-        return result
+        return list(db.execute(_SEL_SESSION_FILES, {"sid": session_id}).scalars())
+
+    @staticmethod
+    def count_session_files(
+        db: Session,
+        session_id: str
+    ) -> int:
+        """Count the files tracked for a session without loading them"""
+        return db.execute(_COUNT_SESSION_FILES, {"sid": session_id}).scalar_one()
     
     @staticmethod
     def get_file_by_name(
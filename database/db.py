@@ -1,16 +1,28 @@
 from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional, Generator
-from datetime import datetime, timedelta
+from typing import List, Optional, Generator, Iterator
+from datetime import datetime, timedelta, timezone
 
-from sqlalchemy import create_engine, desc
+from sqlalchemy import bindparam, create_engine, desc, event, func, insert, inspect, select, text, update
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import StaticPool
 
-from database.models import Base
+from database.models import Base, utc_now
 from database.models.code_execution_models import CodeExecution, WorkspaceFileMetadata
-from database.models.chat_models import Chat
+from database.models.chat_models import Chat, Message
+from database.models.cache_models import AgentCacheEntry
 
-from utils.settings import DATABASE_URL
+from utils.settings import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE
+
+# Applied to every new SQLite connection: WAL lets readers run alongside a
+# writer, and NORMAL sync is durable enough under WAL.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+)
 
 
 def _connect_args(db_url: Optional[str]) -> dict:
@@ -20,6 +32,36 @@ def _connect_args(db_url: Optional[str]) -> dict:
     return {}
 
 
+def _is_sqlite_memory(db_url: str) -> bool:
+    return db_url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in db_url
+
+
+def _engine_args(db_url: str) -> dict:
+    """Get engine/pool arguments based on database type"""
+    if db_url.startswith("sqlite"):
+        # File databases get SQLAlchemy's default QueuePool. An in-memory
+        # database lives inside one connection, so every thread (routes run
+        # DB work via to_thread) must share that connection.
+        if _is_sqlite_memory(db_url):
+            return {"poolclass": StaticPool}
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Configure a new SQLite connection for concurrent access"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
 class DatabaseManager:
     """
     Unified database manager for connection, initialization, and operations.
@@ -48,19 +90,32 @@ class DatabaseManager:
             database_url,
             pool_pre_ping=True,
             connect_args=_connect_args(database_url),
-            echo=False  # Set to True for SQL query logging
+            echo=False,  # Set to True for SQL query logging
+            insertmanyvalues_page_size=1000,
+            # Room for every statement variant the repositories compile
+            query_cache_size=1200,
+            **_engine_args(database_url)
         )
 
+        if database_url.startswith("sqlite"):
+            event.listen(self.engine, "connect", _set_sqlite_pragmas)
+
         Base.metadata.bind = self.engine
         self.SessionLocal = sessionmaker(
             bind=self.engine,
             autocommit=False,
-            autoflush=False
+            autoflush=False,
+            # Objects stay loaded after commit; avoids a SELECT per attribute
+            # access and lets callers use results after the session closes
+            expire_on_commit=False
         )
 
     def init_db(self):
         """Initialize all database tables"""
         Base.metadata.create_all(bind=self.engine)
+        self._migrate_message_seq()
+        self._migrate_chat_revision()
+        self._migrate_code_execution_indexes()
 
         if self.database_url.startswith("sqlite"):
             db_path = Path(self.database_url.replace("sqlite:///", ""))
@@ -68,6 +123,62 @@ class DatabaseManager:
         else:
             print("✅ Database initialized")
 
+    def _migrate_message_seq(self) -> None:
+        """
+        Add and backfill messages.seq on databases created before it existed.
+
+        create_all() never alters an existing table, so the column is added
+        here, numbered per chat in the old (created_at, id) order, and then
+        given the unique (chat_fk, seq) index the model declares.
+        """
+        columns = {column["name"] for column in inspect(self.engine).get_columns(Message.__tablename__)}
+        if "seq" in columns:
+            return
+
+        messages = Message.__table__
+        ranked = select(
+            messages.c.id,
+            (func.row_number().over(
+                partition_by=messages.c.chat_fk,
+                order_by=(messages.c.created_at, messages.c.id),
+            ) - 1).label("rn"),
+        )
+        set_seq = update(messages).where(messages.c.id == bindparam("mid")).values(seq=bindparam("rn"))
+
+        with self.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE messages ADD COLUMN seq INTEGER NOT NULL DEFAULT 0"))
+            rows = conn.execute(ranked).all()
+            if rows:
+                conn.execute(set_seq, [{"mid": row.id, "rn": row.rn} for row in rows])
+            conn.execute(text("CREATE UNIQUE INDEX uq_message_chat_seq ON messages (chat_fk, seq)"))
+            if conn.dialect.name in ("sqlite", "postgresql"):
+                # Superseded by the seq index
+                conn.execute(text("DROP INDEX IF EXISTS ix_messages_chat_created_id"))
+
+        print(f"✅ Backfilled messages.seq for {len(rows)} messages")
+
+    def _migrate_chat_revision(self) -> None:
+        """Add chats.revision on databases created before it existed"""
+        columns = {column["name"] for column in inspect(self.engine).get_columns(Chat.__tablename__)}
+        if "revision" in columns:
+            return
+
+        with self.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE chats ADD COLUMN revision INTEGER NOT NULL DEFAULT 0"))
+
+    def _migrate_code_execution_indexes(self) -> None:
+        """
+        Create the composite history/listing indexes on tables that predate them.
+
+        create_all() only indexes the tables it creates itself; each index here
+        is created only if it is missing (CREATE INDEX IF NOT EXISTS).
+        """
+        with self.engine.begin() as conn:
+            for table in (CodeExecution.__table__, WorkspaceFileMetadata.__table__):
+                for index in table.indexes:
+                    if len(index.columns) > 1:
+                        index.create(conn, checkfirst=True)
+
     @contextmanager
     def get_session(self) -> Generator[Session, None, None]:
         """
@@ -88,6 +199,24 @@ class DatabaseManager:
         finally:
             session.close()
 
+    @contextmanager
+    def read_session(self) -> Generator[Session, None, None]:
+        """
+        Context manager for read-only database sessions.
+
+        Skips the commit of `get_session`; closing the session ends the
+        (read) transaction.
+
+        Usage:
+            with db_manager.read_session() as session:
+                session.query(...)
+        """
+        session = self.SessionLocal()
+        try:
+            yield session
+        finally:
+            session.close()
+
     def get_session_instance(self) -> Session:
         """
         Get a database session instance (for dependency injection).
@@ -108,7 +237,7 @@ class DatabaseManager:
         Returns:
             str: user_id or None if not found
         """
-        with self.get_session() as session:
+        with self.read_session() as session:
             chat = session.query(Chat)\
                 .filter(Chat.chat_id == chat_id)\
                 .first()
@@ -165,6 +294,36 @@ class DatabaseManager:
             session.flush()
             return execution.id
 
+    def save_executions_bulk(self, rows: List[dict]) -> List[int]:
+        """
+        Save several code execution results in a single transaction.
+
+        Missing user_ids are auto-fetched from the chats table once per session.
+
+        Args:
+            rows: Dicts with the same keys as `save_execution` arguments
+
+        Returns:
+            List[int]: Execution IDs, in the same order as `rows`
+        """
+        if not rows:
+            return []
+
+        user_ids = {}
+        params = []
+        for row in rows:
+            row = dict(row)
+            if row.get("user_id") is None:
+                session_id = row["session_id"]
+                if session_id not in user_ids:
+                    user_ids[session_id] = self.get_user_id_from_chat(session_id)
+                row["user_id"] = user_ids[session_id]
+            params.append(row)
+
+        stmt = insert(CodeExecution).returning(CodeExecution.id, sort_by_parameter_order=True)
+        with self.get_session() as session:
+            return list(session.execute(stmt, params).scalars())
+
     def get_session_history(
             self,
             session_id: str,
@@ -180,7 +339,7 @@ class DatabaseManager:
         Returns:
             List of CodeExecution objects
         """
-        with self.get_session() as session:
+        with self.read_session() as session:
             return session.query(CodeExecution) \
                 .filter(CodeExecution.session_id == session_id) \
                 .order_by(desc(CodeExecution.created_at)) \
@@ -202,14 +361,40 @@ class DatabaseManager:
         Returns:
             List of CodeExecution objects
         """
-        since = datetime.utcnow() - timedelta(hours=hours)
+        since = datetime.now(timezone.utc) - timedelta(hours=hours)
 
-        with self.get_session() as session:
+        with self.read_session() as session:
             return session.query(CodeExecution) \
                 .filter(CodeExecution.created_at >= since) \
                 .order_by(desc(CodeExecution.created_at)) \
                 .limit(limit) \
                 .all()
+
+    def iter_recent_executions(
+            self,
+            hours: int = 24,
+            limit: int = 100,
+            chunk_size: int = 200
+    ) -> Iterator[CodeExecution]:
+        """
+        Stream recent executions across all sessions in chunks.
+
+        Args:
+            hours: Time window in hours
+            limit: Maximum number of results
+            chunk_size: Rows fetched per round trip
+
+        Yields:
+            CodeExecution objects, newest first
+        """
+        since = datetime.now(timezone.utc) - timedelta(hours=hours)
+
+        with self.read_session() as session:
+            yield from session.query(CodeExecution) \
+                .filter(CodeExecution.created_at >= since) \
+                .order_by(desc(CodeExecution.created_at)) \
+                .limit(limit) \
+                .yield_per(chunk_size)
     
     def get_user_executions(
             self,
@@ -226,7 +411,7 @@ class DatabaseManager:
         Returns:
             List of CodeExecution objects
         """
-        with self.get_session() as session:
+        with self.read_session() as session:
             return session.query(CodeExecution)\
                 .filter(CodeExecution.user_id == user_id)\
                 .order_by(desc(CodeExecution.created_at))\
@@ -243,10 +428,8 @@ class DatabaseManager:
         Returns:
             CodeExecution object or None
         """
-        with self.get_session() as session:
-            return session.query(CodeExecution) \
-                .filter(CodeExecution.id == execution_id) \
-                .first()
+        with self.read_session() as session:
+            return session.get(CodeExecution, execution_id)
 
     # ==================== Workspace Repository Methods ====================
 
@@ -289,6 +472,25 @@ class DatabaseManager:
             session.flush()
             return file_meta.id
 
+    def save_file_metadata_bulk(self, rows: List[dict]) -> List[int]:
+        """
+        Save metadata for several workspace files in a single transaction.
+
+        Args:
+            rows: Dicts with the same keys as `save_file_metadata` arguments
+
+        Returns:
+            List[int]: File metadata IDs, in the same order as `rows`
+        """
+        if not rows:
+            return []
+
+        stmt = insert(WorkspaceFileMetadata).returning(
+            WorkspaceFileMetadata.id, sort_by_parameter_order=True
+        )
+        with self.get_session() as session:
+            return list(session.execute(stmt, list(rows)).scalars())
+
     def get_session_files(self, session_id: str) -> List[WorkspaceFileMetadata]:
         """
         Get all files for a session.
@@ -299,11 +501,32 @@ class DatabaseManager:
         Returns:
             List of WorkspaceFileMetadata objects
         """
-        with self.get_session() as session:
+        with self.read_session() as session:
             return session.query(WorkspaceFileMetadata) \
                 .filter(WorkspaceFileMetadata.session_id == session_id) \
                 .order_by(desc(WorkspaceFileMetadata.created_at)) \
                 .all()
+
+    def iter_session_files(
+            self,
+            session_id: str,
+            chunk_size: int = 200
+    ) -> Iterator[WorkspaceFileMetadata]:
+        """
+        Stream all files for a session in chunks.
+
+        Args:
+            session_id: Session identifier
+            chunk_size: Rows fetched per round trip
+
+        Yields:
+            WorkspaceFileMetadata objects, newest first
+        """
+        with self.read_session() as session:
+            yield from session.query(WorkspaceFileMetadata) \
+                .filter(WorkspaceFileMetadata.session_id == session_id) \
+                .order_by(desc(WorkspaceFileMetadata.created_at)) \
+                .yield_per(chunk_size)
     
     def get_user_files(self, user_id: str) -> List[WorkspaceFileMetadata]:
         """
@@ -315,19 +538,10 @@ class DatabaseManager:
         Returns:
             List of WorkspaceFileMetadata objects
         """
-        with self.get_session() as session:
-            # Get all chat_ids for this user
-            chats = session.query(Chat.chat_id)\
-                .filter(Chat.user_id == user_id)\
-                .all()
-            
-            chat_ids = [chat.chat_id for chat in chats]
-            
-            if not chat_ids:
-                return []
-            
+        with self.read_session() as session:
             return session.query(WorkspaceFileMetadata)\
-                .filter(WorkspaceFileMetadata.session_id.in_(chat_ids))\
+                .join(Chat, Chat.chat_id == WorkspaceFileMetadata.session_id)\
+                .filter(Chat.user_id == user_id)\
                 .order_by(desc(WorkspaceFileMetadata.created_at))\
                 .all()
 
@@ -346,7 +560,7 @@ class DatabaseManager:
         Returns:
             WorkspaceFileMetadata object or None
         """
-        with self.get_session() as session:
+        with self.read_session() as session:
             return session.query(WorkspaceFileMetadata) \
                 .filter(
                 WorkspaceFileMetadata.session_id == session_id,
@@ -372,17 +586,14 @@ class DatabaseManager:
             bool: Success status
         """
         with self.get_session() as session:
-            file_meta = session.query(WorkspaceFileMetadata) \
+            updated = session.query(WorkspaceFileMetadata) \
                 .filter(
                 WorkspaceFileMetadata.session_id == session_id,
                 WorkspaceFileMetadata.filename == filename
             ) \
-                .first()
+                .update({"description": description}, synchronize_session=False)
 
-            if file_meta:
-                file_meta.description = description
-                return True
-            return False
+            return updated > 0
 
     def delete_file_metadata(
             self,
@@ -400,17 +611,14 @@ class DatabaseManager:
             bool: Success status
         """
         with self.get_session() as session:
-            file_meta = session.query(WorkspaceFileMetadata) \
+            deleted = session.query(WorkspaceFileMetadata) \
                 .filter(
                 WorkspaceFileMetadata.session_id == session_id,
                 WorkspaceFileMetadata.filename == filename
             ) \
-                .first()
+                .delete(synchronize_session=False)
 
-            if file_meta:
-                session.delete(file_meta)
-                return True
-            return False
+            return deleted > 0
 
     def get_workspace_stats(self, session_id: str) -> dict:
         """
@@ -422,31 +630,34 @@ class DatabaseManager:
         Returns:
             dict: Statistics including file count, total size, and breakdown by type
         """
-        files = self.get_session_files(session_id)
-
-        if not files:
-            return {
-                "session_id": session_id,
-                "total_files": 0,
-                "total_size": 0,
-                "total_size_mb": 0,
-                "by_type": {}
-            }
+        with self.read_session() as session:
+            rows = session.query(
+                WorkspaceFileMetadata.file_type,
+                func.count(WorkspaceFileMetadata.id),
+                func.sum(WorkspaceFileMetadata.file_size)
+            )\
+                .filter(WorkspaceFileMetadata.session_id == session_id)\
+                .group_by(WorkspaceFileMetadata.file_type)\
+                .all()
 
-        total_size = sum(f.file_size for f in files)
+        total_files = 0
+        total_size = 0
 
         # Group by file type
         by_type = {}
-        for file_meta in files:
-            file_type = file_meta.file_type or "unknown"
+        for file_type, count, size in rows:
+            file_type = file_type or "unknown"
+            size = size or 0
+            total_files += count
+            total_size += size
             if file_type not in by_type:
                 by_type[file_type] = {"count": 0, "size": 0}
-            by_type[file_type]["count"] += 1
-            by_type[file_type]["size"] += file_meta.file_size
+            by_type[file_type]["count"] += count
+            by_type[file_type]["size"] += size
 
         return {
             "session_id": session_id,
-            "total_files": len(files),
+            "total_files": total_files,
             "total_size": total_size,
             "total_size_mb": round(total_size / (1024 * 1024), 2),
             "by_type": by_type
@@ -462,41 +673,43 @@ class DatabaseManager:
         Returns:
             dict: Statistics including file count, total size, and breakdown by type
         """
-        files = self.get_user_files(user_id)
-        
-        if not files:
-            return {
-                "user_id": user_id,
-                "total_files": 0,
-                "total_size": 0,
-                "total_size_mb": 0,
-                "by_type": {},
-                "by_session": {}
-            }
-        
-        total_size = sum(f.file_size for f in files)
-        
-        # Group by file type
+        with self.read_session() as session:
+            rows = session.query(
+                WorkspaceFileMetadata.file_type,
+                WorkspaceFileMetadata.session_id,
+                func.count(WorkspaceFileMetadata.id),
+                func.sum(WorkspaceFileMetadata.file_size)
+            )\
+                .join(Chat, Chat.chat_id == WorkspaceFileMetadata.session_id)\
+                .filter(Chat.user_id == user_id)\
+                .group_by(WorkspaceFileMetadata.file_type, WorkspaceFileMetadata.session_id)\
+                .all()
+
+        total_files = 0
+        total_size = 0
         by_type = {}
-        for file_meta in files:
-            file_type = file_meta.file_type or "unknown"
+        by_session = {}
+        for file_type, session_id, count, size in rows:
+            file_type = file_type or "unknown"
+            size = size or 0
+            total_files += count
+            total_size += size
+
+            # Group by file type
             if file_type not in by_type:
                 by_type[file_type] = {"count": 0, "size": 0}
-            by_type[file_type]["count"] += 1
-            by_type[file_type]["size"] += file_meta.file_size
-        
-        # Group by session
-        by_session = {}
-        for file_meta in files:
-            session_id = file_meta.session_id
+            by_type[file_type]["count"] += count
+            by_type[file_type]["size"] += size
+
+            # Group by session
             if session_id not in by_session:
                 by_session[session_id] = {"count": 0, "size": 0}
-            by_session[session_id]["count"] += 1
-            by_session[session_id]["size"] += file_meta.file_size
-        
+            by_session[session_id]["count"] += count
+            by_session[session_id]["size"] += size
+
         return {
             "user_id": user_id,
-            "total_files": len(files),
+            "total_files": total_files,
             "total_size": total_size,
             "total_size_mb": round(total_size / (1024 * 1024), 2),
             "by_type": by_type,
@@ -518,7 +731,7 @@ class DatabaseManager:
         Returns:
             int: Number of deleted records
         """
-        cutoff_time = datetime.utcnow() - timedelta(hours=older_than_hours)
+        cutoff_time = datetime.now(timezone.utc) - timedelta(hours=older_than_hours)
 
         with self.get_session() as session:
             deleted = session.query(WorkspaceFileMetadata) \
@@ -526,11 +739,83 @@ class DatabaseManager:
                 WorkspaceFileMetadata.session_id == session_id,
                 WorkspaceFileMetadata.created_at < cutoff_time
             ) \
-                .delete()
+                .delete(synchronize_session=False)
 
             return deleted
 
 
+    # ==================== Agent Cache Methods ====================
+
+    def get_cache_entry(self, key: str, ttl_seconds: int) -> Optional[dict]:
+        """
+        Get a cached agent payload if it exists and is not expired.
+
+        Args:
+            key: Cache key (SHA-256 hex digest)
+            ttl_seconds: Maximum age of the entry in seconds
+
+        Returns:
+            Optional[dict]: Cached payload or None
+        """
+        cutoff_time = datetime.now(timezone.utc) - timedelta(seconds=ttl_seconds)
+
+        with self.read_session() as session:
+            # Expired rows are left for save/prune to overwrite or evict
+            return session.query(AgentCacheEntry.payload) \
+                .filter(
+                AgentCacheEntry.key == key,
+                AgentCacheEntry.created_at >= cutoff_time
+            ) \
+                .scalar()
+
+    def save_cache_entry(self, key: str, payload: dict, size_bytes: int) -> None:
+        """
+        Insert or replace a cached agent payload.
+
+        Args:
+            key: Cache key (SHA-256 hex digest)
+            payload: JSON-serializable payload
+            size_bytes: Serialized payload size, used for pruning
+        """
+        with self.get_session() as session:
+            session.merge(AgentCacheEntry(
+                key=key,
+                payload=payload,
+                size_bytes=size_bytes,
+                created_at=utc_now()
+            ))
+
+    def prune_cache(self, max_bytes: int, key_prefix: str = "") -> int:
+        """
+        Delete the oldest cache entries until the total size fits the budget.
+
+        Args:
+            max_bytes: Total size budget in bytes
+            key_prefix: Only consider entries whose key starts with this prefix
+
+        Returns:
+            int: Number of deleted records
+        """
+        with self.get_session() as session:
+            query = session.query(AgentCacheEntry.key, AgentCacheEntry.size_bytes)
+            if key_prefix:
+                query = query.filter(AgentCacheEntry.key.startswith(key_prefix))
+
+            total = 0
+            stale_keys = []
+            for key, size_bytes in query.order_by(desc(AgentCacheEntry.created_at)):
+                total += size_bytes or 0
+                if total > max_bytes:
+                    stale_keys.append(key)
+
+            if not stale_keys:
+                return 0
+
+            return session.query(AgentCacheEntry) \
+                .filter(AgentCacheEntry.key.in_(stale_keys)) \
+                .delete(synchronize_session=False)
+
+
 # ==================== Global Instance ====================
 
 # Create global database manager instance
@@ -542,9 +827,21 @@ SessionLocal = db_manager.SessionLocal
 Base.metadata.bind = core_engine
 
 
+_INITIALIZED = False
+
+
 def init_db():
-    """Initialize database (legacy compatibility)"""
+    """
+    Initialize database tables once per process.
+
+    Called from the FastAPI lifespan hook; for LangGraph Studio or other
+    standalone entrypoints run `python -m database.db init`.
+    """
+    global _INITIALIZED
+    if _INITIALIZED:
+        return
     db_manager.init_db()
+    _INITIALIZED = True
 
 
 @contextmanager
@@ -559,4 +856,12 @@ def get_db_session() -> Session:
     return db_manager.get_session_instance()
 
 
-init_db()
\ No newline at end of file
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Database management commands")
+    parser.add_argument("command", choices=["init"], help="init: create all database tables")
+    args = parser.parse_args()
+
+    if args.command == "init":
+        init_db()
@@ -1,15 +1,110 @@
 from __future__ import annotations
 
-from typing import List, Optional
+import base64
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
-from sqlalchemy import delete, select
-from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy import Integer, Text, bindparam, cast, delete, func, insert, select, update
+from sqlalchemy.dialects.postgresql import JSONB, array as pg_array, insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import raiseload
 
 from database.db import SessionLocal
 from database.models.chat_models import Chat, Message, User
 
+# (user_id, chat_id) -> Chat.id; chats are never re-keyed, so entries stay valid
+_CHAT_PK_CACHE: Dict[Tuple[str, str], int] = {}
+_CHAT_PK_CACHE_MAX = 10_000
+
+
+def encode_cursor(seq: int) -> str:
+    """Opaque keyset cursor: seq of the last returned message."""
+    return base64.urlsafe_b64encode(str(seq).encode("ascii")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Inverse of `encode_cursor`; raises ValueError on malformed input."""
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii"))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def _set_content_expr(dialect_name: str, new_content: str):
+    """SQL expression for `payload` with payload["data"]["content"] replaced."""
+    if dialect_name == "postgresql":
+        patched = func.jsonb_set(
+            cast(Message.payload, JSONB),
+            pg_array(["data", "content"], type_=Text),
+            func.to_jsonb(cast(new_content, Text)),
+        )
+        return cast(patched, Message.payload.type)
+    # SQLite (and MySQL) json_set
+    return func.json_set(Message.payload, "$.data.content", new_content)
+
+
+# Attempts at appending a batch when concurrent writers keep taking its seq values
+_APPEND_ATTEMPTS = 3
+
+# Dialects with INSERT ... ON CONFLICT DO NOTHING
+_UPSERT_INSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+
+# ==================== Statements ====================
+# The hot queries are built once with bind parameters and reused per call.
+# Parameter names must not clash with column names in INSERT/UPDATE.
+
+_SEL_CHAT_PK = select(Chat.id).where(
+    Chat.user_id == bindparam("user_id"), Chat.chat_id == bindparam("chat_id")
+)
+# Every message write bumps the chat's revision first; the UPDATE also takes
+# the chat's row lock (PostgreSQL) or the write lock (SQLite), which queues
+# concurrent writers of one chat
+_BUMP_REVISION = update(Chat).where(Chat.id == bindparam("chat_pk")).values(revision=Chat.revision + 1)
+_SEL_REVISION = select(Chat.revision).where(Chat.id == bindparam("chat_pk"))
+_SEL_NEXT_SEQ = select(func.coalesce(func.max(Message.seq), -1) + 1).where(
+    Message.chat_fk == bindparam("chat_pk")
+)
+_SEL_PAYLOADS = (
+    select(Message.payload).where(Message.chat_fk == bindparam("chat_pk")).order_by(Message.seq.asc())
+)
+_SEL_PAGE = (
+    select(Message.seq, Message.payload)
+    .where(Message.chat_fk == bindparam("chat_pk"), Message.seq > bindparam("after_seq"))
+    .order_by(Message.seq.asc())
+    .limit(bindparam("page_size", type_=Integer))
+)
+_INS_MESSAGES = insert(Message)
+_DEL_FROM_SEQ = delete(Message).where(
+    Message.chat_fk == bindparam("chat_pk"), Message.seq >= bindparam("from_seq")
+)
+_DEL_ALL = delete(Message).where(Message.chat_fk == bindparam("chat_pk"))
+
+_UPSERT_USER = {
+    name: dialect_insert(User).values(user_id=bindparam("uid")).on_conflict_do_nothing()
+    for name, dialect_insert in _UPSERT_INSERTS.items()
+}
+_UPSERT_CHAT = {
+    name: dialect_insert(Chat)
+    .values(user_id=bindparam("uid"), chat_id=bindparam("cid"))
+    .on_conflict_do_nothing(index_elements=["user_id", "chat_id"])
+    .returning(Chat.id)
+    for name, dialect_insert in _UPSERT_INSERTS.items()
+}
+
+
+def _update_content_stmt(dialect_name: str):
+    return (
+        update(Message)
+        .where(Message.chat_fk == bindparam("chat_pk"), Message.seq == bindparam("idx"))
+        .values(payload=_set_content_expr(dialect_name, bindparam("new_content", type_=Text)))
+    )
+
+
+# Keyed by dialect; anything but PostgreSQL uses json_set
+_UPDATE_CONTENT = {"postgresql": _update_content_stmt("postgresql"), None: _update_content_stmt("sqlite")}
+
 
 class PersistentChatMessageHistory(BaseChatMessageHistory):
     """
@@ -22,89 +117,217 @@ class PersistentChatMessageHistory(BaseChatMessageHistory):
     def __init__(self, user_id: str, chat_id: str):
         self.user_id = user_id
         self.chat_id = chat_id
+        self._chat_pk: Optional[int] = _CHAT_PK_CACHE.get((user_id, chat_id))
+        # Chat revision as of this object's last write; None before any write
+        self.revision: Optional[int] = None
 
     def _ensure_user_and_chat(self) -> int:
         """User + Chat yoksa oluşturur, Chat.id (PK) döndürür."""
+        if self._chat_pk is not None:
+            return self._chat_pk
+
         with SessionLocal.begin() as db:
-            user = db.get(User, self.user_id)
-            if user is None:
-                user = User(user_id=self.user_id)
-                db.add(user)
-                db.flush()
+            dialect_name = db.get_bind().dialect.name
+            if dialect_name in _UPSERT_INSERTS:
+                chat_pk = self._upsert_user_and_chat(db, dialect_name)
+            else:
+                chat_pk = self._get_or_create_user_and_chat(db)
+
+        if len(_CHAT_PK_CACHE) >= _CHAT_PK_CACHE_MAX:
+            _CHAT_PK_CACHE.clear()
+        _CHAT_PK_CACHE[(self.user_id, self.chat_id)] = chat_pk
+        self._chat_pk = chat_pk
+        return chat_pk
 
-            stmt = select(Chat).where(Chat.user_id == self.user_id, Chat.chat_id == self.chat_id)
-            chat = db.execute(stmt).scalars().first()
-            if chat is None:
-                chat = Chat(user_id=self.user_id, chat_id=self.chat_id)
-                db.add(chat)
-                db.flush()
+    def _upsert_user_and_chat(self, db, dialect_name: str) -> int:
+        """Two INSERT ... ON CONFLICT DO NOTHING statements; a SELECT only if the chat existed."""
+        db.execute(_UPSERT_USER[dialect_name], {"uid": self.user_id})
+        chat_pk = db.execute(_UPSERT_CHAT[dialect_name], {"uid": self.user_id, "cid": self.chat_id}).scalar()
+        if chat_pk is None:
+            chat_pk = db.execute(_SEL_CHAT_PK, {"user_id": self.user_id, "chat_id": self.chat_id}).scalar_one()
+        return chat_pk
 
-            return chat.id
+    def _get_or_create_user_and_chat(self, db) -> int:
+        """Portable get-or-create for dialects without ON CONFLICT."""
+        # Only the rows themselves are needed; fail fast on accidental lazy loads
+        user = db.get(User, self.user_id, options=[raiseload("*")])
+        if user is None:
+            user = User(user_id=self.user_id)
+            db.add(user)
+            db.flush()
+
+        stmt = (
+            select(Chat)
+            .where(Chat.user_id == self.user_id, Chat.chat_id == self.chat_id)
+            .options(raiseload("*"))
+        )
+        chat = db.execute(stmt).scalars().first()
+        if chat is None:
+            chat = Chat(user_id=self.user_id, chat_id=self.chat_id)
+            db.add(chat)
+            db.flush()
+
+        return chat.id
+
+    def _resolve_chat_pk(self) -> Optional[int]:
+        """Chat.id (PK) if the chat exists, without creating anything."""
+        if self._chat_pk is None:
+            chat_pk = get_chat_pk(self.user_id, self.chat_id)
+            if chat_pk is not None:
+                _CHAT_PK_CACHE[(self.user_id, self.chat_id)] = chat_pk
+                self._chat_pk = chat_pk
+        return self._chat_pk
 
     @property
-    def messages(self) -> List[BaseMessage]:
+    def chat_pk(self) -> Optional[int]:
+        """Chat.id (PK) if the chat exists; cached once resolved."""
+        return self._resolve_chat_pk()
+
+    def _bump_revision(self, db, chat_pk: int) -> None:
+        """Count a change to the chat's messages, inside the writing transaction."""
+        db.execute(_BUMP_REVISION, {"chat_pk": chat_pk})
+        self.revision = db.execute(_SEL_REVISION, {"chat_pk": chat_pk}).scalar_one()
+
+    def message_count(self) -> int:
+        """Number of persisted messages (a single index lookup: seq is dense)."""
+        chat_pk = self._resolve_chat_pk()
+        if chat_pk is None:
+            return 0
         with SessionLocal() as db:
-            stmt = (
-                select(Message.payload)
-                .join(Chat, Chat.id == Message.chat_fk)
-                .where(Chat.user_id == self.user_id, Chat.chat_id == self.chat_id)
-                .order_by(Message.created_at.asc(), Message.id.asc())
+            return db.execute(_SEL_NEXT_SEQ, {"chat_pk": chat_pk}).scalar_one()
+
+    def payloads_page(
+        self, limit: int, cursor: Optional[str] = None
+    ) -> Tuple[List[Tuple[int, dict]], Optional[str]]:
+        """
+        Keyset-paginated history in chronological order, as stored payloads.
+
+        Returns (index, payload) pairs, where index is the absolute position
+        in the chat (== seq) and payload is the message_to_dict() form, plus
+        the cursor for the next page (None on the last page). Readers that
+        only need type/content can use this and skip building messages.
+        """
+        chat_pk = self._resolve_chat_pk()
+        if chat_pk is None:
+            return [], None
+
+        # seq starts at 0, so "after -1" is the first page
+        params = {
+            "chat_pk": chat_pk,
+            "after_seq": decode_cursor(cursor) if cursor is not None else -1,
+            "page_size": limit + 1,
+        }
+        with SessionLocal() as db:
+            rows = db.execute(_SEL_PAGE, params).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].seq)
+
+        return [(row.seq, row.payload) for row in rows], next_cursor
+
+    def messages_page(
+        self, limit: int, cursor: Optional[str] = None
+    ) -> Tuple[List[Tuple[int, BaseMessage]], Optional[str]]:
+        """
+        Keyset-paginated history in chronological order.
+
+        Same as payloads_page(), with the payloads turned into messages.
+        """
+        page, next_cursor = self.payloads_page(limit, cursor)
+        messages = messages_from_dict([payload for _, payload in page])
+        return [(seq, message) for (seq, _), message in zip(page, messages)], next_cursor
+
+    def _payload_chunks(self, chunk_size: int) -> Iterator[List[dict]]:
+        """Stored payloads in chronological order, `chunk_size` rows per fetch."""
+        chat_pk = self._resolve_chat_pk()
+        if chat_pk is None:
+            return
+
+        with SessionLocal() as db:
+            result = db.execute(
+                _SEL_PAYLOADS, {"chat_pk": chat_pk}, execution_options={"yield_per": chunk_size}
             )
-            rows = db.execute(stmt).all()
-            payloads = [r[0] for r in rows]
-            return messages_from_dict(payloads)
+            for partition in result.partitions():
+                yield [row[0] for row in partition]
 
-    def add_message(self, message: BaseMessage) -> None:
-        chat_pk = self._ensure_user_and_chat()
-        payload = message_to_dict(message)
+    def iter_payloads(self, chunk_size: int = 200) -> Iterator[dict]:
+        """
+        Stream stored payloads in chronological order, so memory stays
+        bounded however long the chat is.
+        """
+        for chunk in self._payload_chunks(chunk_size):
+            yield from chunk
 
-        with SessionLocal.begin() as db:
-            db.add(Message(chat_fk=chat_pk, payload=payload))
+    def iter_messages(self, chunk_size: int = 200) -> Iterator[BaseMessage]:
+        """`iter_payloads()` as messages, converted one chunk at a time."""
+        for chunk in self._payload_chunks(chunk_size):
+            yield from messages_from_dict(chunk)
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return list(self.iter_messages())
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.add_messages([message])
 
     def add_messages(self, messages: List[BaseMessage]) -> None:
         if not messages:
             return
 
         chat_pk = self._ensure_user_and_chat()
-        rows = [Message(chat_fk=chat_pk, payload=message_to_dict(m)) for m in messages]
 
-        with SessionLocal.begin() as db:
-            db.add_all(rows)
+        payloads = [message_to_dict(m) for m in messages]
+
+        for attempt in range(_APPEND_ATTEMPTS):
+            try:
+                # Core executemany (insertmanyvalues) instead of ORM unit-of-work per row
+                with SessionLocal.begin() as db:
+                    self._bump_revision(db, chat_pk)
+                    next_seq = db.execute(_SEL_NEXT_SEQ, {"chat_pk": chat_pk}).scalar_one()
+                    db.execute(
+                        _INS_MESSAGES,
+                        [
+                            {"chat_fk": chat_pk, "seq": next_seq + i, "payload": payload}
+                            for i, payload in enumerate(payloads)
+                        ],
+                    )
+                return
+            except IntegrityError:
+                # Should a concurrent append still claim the same seq values
+                # first, the unique index rejects ours; renumber and retry
+                if attempt == _APPEND_ATTEMPTS - 1:
+                    raise
 
     def delete_message_after(self, message_index: int) -> None:
         """Belirli bir indeksten sonraki tüm mesajları siler (indeks dahil)."""
         chat_pk = self._ensure_user_and_chat()
         with SessionLocal.begin() as db:
-            # Önce o chat'e ait mesajları alıp, id'ye göre sıralayıp sonra siliyoruz
-            stmt = select(Message.id).where(Message.chat_fk == chat_pk).order_by(Message.created_at.asc(), Message.id.asc())
-            message_ids = db.execute(stmt).scalars().all()
-            
-            if message_index < len(message_ids):
-                ids_to_delete = message_ids[message_index:]
-                db.execute(delete(Message).where(Message.id.in_(ids_to_delete)))
+            # seq, sohbet içindeki indeksle aynı; tek sorguda siliyoruz
+            self._bump_revision(db, chat_pk)
+            db.execute(_DEL_FROM_SEQ, {"chat_pk": chat_pk, "from_seq": message_index})
 
     def update_message(self, message_index: int, new_content: str) -> None:
         """Belirli bir indeksteki mesajın içeriğini günceller."""
         chat_pk = self._ensure_user_and_chat()
+        # seq == indeks; içerik veritabanında JSON path ile güncelleniyor (payload taşınmıyor)
         with SessionLocal.begin() as db:
-            stmt = select(Message).where(Message.chat_fk == chat_pk).order_by(Message.created_at.asc(), Message.id.asc())
-            messages = db.execute(stmt).scalars().all()
-            
-            if message_index < len(messages):
-                msg = messages[message_index]
-                payload = dict(msg.payload)
-                payload["data"]["content"] = new_content
-                msg.payload = payload
-                flag_modified(msg, "payload")
+            stmt = _UPDATE_CONTENT.get(db.get_bind().dialect.name, _UPDATE_CONTENT[None])
+            self._bump_revision(db, chat_pk)
+            db.execute(stmt, {"chat_pk": chat_pk, "idx": message_index, "new_content": new_content})
 
     def clear(self) -> None:
+        _CHAT_PK_CACHE.pop((self.user_id, self.chat_id), None)
+        self._chat_pk = None
+
         with SessionLocal.begin() as db:
-            stmt_chat = select(Chat.id).where(Chat.user_id == self.user_id, Chat.chat_id == self.chat_id)
-            chat_pk = db.execute(stmt_chat).scalars().first()
+            chat_pk = db.execute(_SEL_CHAT_PK, {"user_id": self.user_id, "chat_id": self.chat_id}).scalar()
             if chat_pk is None:
                 return
 
-            db.execute(delete(Message).where(Message.chat_fk == chat_pk))
+            self._bump_revision(db, chat_pk)
+            db.execute(_DEL_ALL, {"chat_pk": chat_pk})
 
 
 def get_session_history(user_id: str, chat_id: str) -> BaseChatMessageHistory:
@@ -119,5 +342,4 @@ def clear_history(user_id: str, chat_id: str):
 def get_chat_pk(user_id: str, chat_id: str) -> Optional[int]:
     """Returns Chat.id (internal PK) if chat exists, otherwise None."""
     with SessionLocal() as db:
-        stmt = select(Chat.id).where(Chat.user_id == user_id, Chat.chat_id == chat_id)
-        return db.execute(stmt).scalars().first()
\ No newline at end of file
+        return db.execute(_SEL_CHAT_PK, {"user_id": user_id, "chat_id": chat_id}).scalar()
\ No newline at end of file
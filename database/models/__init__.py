@@ -1,5 +1,13 @@
+from datetime import datetime, timezone
+
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
 
-__all__ = ["Base"]
+
+def utc_now() -> datetime:
+    """Timezone-aware current UTC time (column default)"""
+    return datetime.now(timezone.utc)
+
+
+__all__ = ["Base", "utc_now"]
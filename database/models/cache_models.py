@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, func
+
+from database.models import Base, utc_now
+
+
+class AgentCacheEntry(Base):
+    """Store cached agent results (plans / responses) keyed by fingerprint"""
+    __tablename__ = "agent_cache"
+
+    key = Column(String(128), primary_key=True)
+    payload = Column(JSON, nullable=False)
+    size_bytes = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), default=utc_now, server_default=func.now(), index=True)
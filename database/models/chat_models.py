@@ -2,17 +2,20 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import DateTime, ForeignKey, Integer, JSON, String, UniqueConstraint
+from sqlalchemy import DateTime, ForeignKey, Integer, JSON, String, UniqueConstraint, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
-from database.models import Base
+from database.models import Base, utc_now
 
 
 class User(Base):
     __tablename__ = "users"
 
     user_id: Mapped[str] = mapped_column(String, primary_key=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=utc_now, server_default=func.now(), nullable=False
+    )
 
     chats: Mapped[list["Chat"]] = relationship(
         "Chat",
@@ -30,7 +33,12 @@ class Chat(Base):
     user_id: Mapped[str] = mapped_column(String, ForeignKey("users.user_id"), nullable=False, index=True)
     chat_id: Mapped[str] = mapped_column(String, nullable=False, index=True)
 
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=utc_now, server_default=func.now(), nullable=False
+    )
+
+    # Bumped by every change to the chat's messages
+    revision: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
 
     user: Mapped["User"] = relationship("User", back_populates="chats")
     messages: Mapped[list["Message"]] = relationship(
@@ -42,14 +50,20 @@ class Chat(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    # seq is the message's position in its chat (0, 1, 2, ...); the unique
+    # index serves ordered reads, keyset pages and suffix deletes.
+    __table_args__ = (UniqueConstraint("chat_fk", "seq", name="uq_message_chat_seq"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
-    chat_fk: Mapped[int] = mapped_column(Integer, ForeignKey("chats.id"), nullable=False, index=True)
+    chat_fk: Mapped[int] = mapped_column(Integer, ForeignKey("chats.id"), nullable=False)
+    seq: Mapped[int] = mapped_column(Integer, nullable=False)
 
-    payload: Mapped[dict] = mapped_column(JSON, nullable=False)
+    payload: Mapped[dict] = mapped_column(JSON().with_variant(JSONB(), "postgresql"), nullable=False)
 
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=utc_now, server_default=func.now(), nullable=False
+    )
 
     chat: Mapped["Chat"] = relationship("Chat", back_populates="messages")
 
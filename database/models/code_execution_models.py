@@ -1,13 +1,18 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, ForeignKey, JSON, Index, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
-from datetime import datetime
 
-from database.models import Base
+from database.models import Base, utc_now
 
 
 class CodeExecution(Base):
     """Store code execution history"""
     __tablename__ = "code_executions"
+    __table_args__ = (
+        # Per-session / per-user history, newest first
+        Index("ix_code_exec_session_created", "session_id", "created_at"),
+        Index("ix_code_exec_user_created", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String(255), index=True, nullable=False)
@@ -16,9 +21,9 @@ class CodeExecution(Base):
     stdout = Column(Text, nullable=True)
     stderr = Column(Text, nullable=True)
     returncode = Column(Integer, nullable=False)
-    created_files = Column(JSON, default=list)  # List of filenames
+    created_files = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False, default=list)  # List of filenames
     execution_time = Column(Float, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    created_at = Column(DateTime(timezone=True), default=utc_now, server_default=func.now(), index=True)
 
     # Relationship
     workspace_files = relationship("WorkspaceFileMetadata", back_populates="execution")
@@ -27,6 +32,11 @@ class CodeExecution(Base):
 class WorkspaceFileMetadata(Base):
     """Store workspace file metadata"""
     __tablename__ = "workspace_files"
+    __table_args__ = (
+        # Lookups by (session, filename) and per-session listings, newest first
+        Index("ix_wsfile_session_filename", "session_id", "filename"),
+        Index("ix_wsfile_session_created", "session_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String(255), index=True, nullable=False)
@@ -36,7 +46,7 @@ class WorkspaceFileMetadata(Base):
     file_type = Column(String(50), nullable=False)
     description = Column(Text, nullable=True)
     execution_id = Column(Integer, ForeignKey("code_executions.id"), nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    created_at = Column(DateTime(timezone=True), default=utc_now, server_default=func.now(), index=True)
 
     # Relationship
     execution = relationship("CodeExecution", back_populates="workspace_files")
\ No newline at end of file
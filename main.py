@@ -1,4 +1,5 @@
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
 from dotenv import load_dotenv
 
 from database.db import init_db
@@ -30,6 +31,9 @@ async def lifespan(app: FastAPI):
     else:
         logger.warning("LangSmith Tracing: Disabled")
 
+    init_db()
+    logger.info("Application started")
+
     yield
 
     # Shutdown
@@ -42,6 +46,9 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Compresses history pages and other JSON; SSE (text/event-stream) is left as is
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 app.include_router(chat.router, prefix="/agent", tags=["Agent"])
 app.include_router(file_agents.router, prefix="/file-agents", tags=["File Agents"])
 
@@ -60,12 +67,5 @@ def health_check():
         "langsmith_tracing": LANGCHAIN_TRACING_V2
     }
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database on startup"""
-    init_db()
-    print("🚀 Application started")
-
-
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
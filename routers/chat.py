@@ -1,7 +1,11 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
 from fastapi.responses import StreamingResponse
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage, SystemMessage
-from langsmith import traceable
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage, SystemMessage, RemoveMessage
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+from utils.helpers.tracing import maybe_traceable
 from schemas.chat_schemas import (
     ChatRequest,
     ChatResponse,
@@ -11,72 +15,108 @@ from schemas.chat_schemas import (
     UIEvent,
     UpdateMessageRequest,
     DeleteMessageRequest,
+    StatusResponse,
 )
-from database.history import get_session_history, clear_history, get_chat_pk, PersistentChatMessageHistory
+from database.history import get_session_history, clear_history, PersistentChatMessageHistory
 from agents.agent import get_agent_executor
+from agents.threads import CHAT_THREADS
 import logging
-import json
+import orjson
 
-# Setup logging for local debugging
-logging.basicConfig(level=logging.INFO)
+# Logging is configured once in main.py
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Stored message type -> UI role; anything else is shown as "system"
+_HISTORY_ROLES = {"human": "user", "ai": "assistant", "tool": "tool"}
+
 REASONING_INSTRUCTION = (
     "Before answering, call the tool `reasoning_tool` with a SHORT, user-visible plan/reasoning summary "
     "(2-6 bullet points). Do NOT reveal hidden chain-of-thought; keep it high level."
 )
 
 
+def _prepare_turn(history, request: ChatRequest) -> Optional[HumanMessage]:
+    """
+    Persist the user side of this turn: apply an edit (and drop what followed
+    it) or append the new message, which is returned.
+    """
+    if request.message_index is not None:
+        if isinstance(history, PersistentChatMessageHistory):
+            history.update_message(request.message_index, request.message)
+            history.delete_message_after(request.message_index + 1)
+        return None
+
+    new_message = HumanMessage(content=request.message)
+    history.add_message(new_message)
+    return new_message
+
+
+def _build_inputs(history, thread_id: str, new_message: Optional[HumanMessage], prefix: list) -> dict:
+    """
+    Agent inputs for this turn.
+
+    When the checkpointer thread is in step with the chat as it was before
+    this turn's message was added, only the new message is sent. Otherwise
+    (new/evicted thread, edit, delete, or another worker wrote to the chat)
+    the full persisted history is sent, replacing whatever the thread had.
+    """
+    base_revision = history.revision - 1 if new_message is not None else None
+    if CHAT_THREADS.is_current(thread_id, base_revision):
+        return {"messages": [new_message]}
+
+    return {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES)] + prefix + history.messages}
+
+
 @router.get("/history", response_model=ChatHistoryResponse)
-async def get_history(user_id: str, chat_id: str):
+def get_history(
+    user_id: str,
+    chat_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+):
     """
-    Returns persisted chat history for (user_id, chat_id).
-    UI uses this to "continue an existing chat" and show visible history.
+    Returns persisted chat history for (user_id, chat_id), one page at a time.
+    UI uses this to "continue an existing chat" and show visible history;
+    follow `next_cursor` until it is null to load the full chat.
     """
     try:
         history = get_session_history(user_id, chat_id)
-        chat_pk = get_chat_pk(user_id, chat_id)
+        page, next_cursor = history.payloads_page(limit, cursor)
+        chat_pk = history.chat_pk
 
+        # Map stored payloads straight to the response; no message objects needed.
+        # Every field is built here with the right type, so validation is skipped.
         out: list[HistoryMessage] = []
-        for i, msg in enumerate(history.messages):
-            if isinstance(msg, HumanMessage):
-                out.append(HistoryMessage(role="user", content=str(msg.content), type="human", index=i))
-            elif isinstance(msg, AIMessage):
-                out.append(HistoryMessage(role="assistant", content=str(msg.content), type="ai", index=i))
-            elif isinstance(msg, ToolMessage):
-                out.append(
-                    HistoryMessage(
-                        role="tool",
-                        content=str(msg.content),
-                        name=getattr(msg, "name", None),
-                        type="tool",
-                        index=i,
-                    )
-                )
-            else:
-                out.append(
-                    HistoryMessage(
-                        role="system",
-                        content=str(getattr(msg, "content", msg)),
-                        type=msg.__class__.__name__,
-                        index=i,
-                    )
+        for i, payload in page:
+            msg_type = payload.get("type", "system")
+            data = payload.get("data", {})
+            out.append(
+                HistoryMessage.model_construct(
+                    role=_HISTORY_ROLES.get(msg_type, "system"),
+                    content=str(data.get("content", "")),
+                    name=data.get("name") if msg_type == "tool" else None,
+                    type=msg_type,
+                    index=i,
                 )
+            )
 
-        return ChatHistoryResponse(
+        return ChatHistoryResponse.model_construct(
             user_id=user_id,
             chat_id=chat_id,
             chat_pk=chat_pk,
             messages=out,
+            next_cursor=next_cursor,
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.put("/history/message")
-async def update_message_endpoint(request: UpdateMessageRequest):
+@router.put("/history/message", response_model=StatusResponse)
+def update_message_endpoint(request: UpdateMessageRequest):
     try:
         history = get_session_history(request.user_id, request.chat_id)
         if isinstance(history, PersistentChatMessageHistory):
@@ -88,8 +128,8 @@ async def update_message_endpoint(request: UpdateMessageRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.delete("/history/message")
-async def delete_message_endpoint(user_id: str, chat_id: str, message_index: int):
+@router.delete("/history/message", response_model=StatusResponse)
+def delete_message_endpoint(user_id: str, chat_id: str, message_index: int):
     try:
         history = get_session_history(user_id, chat_id)
         if isinstance(history, PersistentChatMessageHistory):
@@ -102,7 +142,7 @@ async def delete_message_endpoint(user_id: str, chat_id: str, message_index: int
 
 
 @router.post("/chat", response_model=ChatResponse)
-@traceable(
+@maybe_traceable(
     name="chat_endpoint",
     tags=["chat", "agent", "lang-chain-mc"],
     metadata={"endpoint": "/agent/chat"}
@@ -113,22 +153,14 @@ async def chat_endpoint(request: ChatRequest):
     """
     try:
         history = get_session_history(request.user_id, request.chat_id)
-        
-        if request.message_index is not None:
-            if isinstance(history, PersistentChatMessageHistory):
-                history.update_message(request.message_index, request.message)
-                history.delete_message_after(request.message_index + 1)
-        else:
-            history.add_message(HumanMessage(content=request.message))
-
-        agent = get_agent_executor(request.model_name)
-        # We still pass history.messages to inputs because the first message
-        # is necessary if the checkpointer is new. LangGraph will handle
-        # deduplication if messages are identical, but it's safer to provide
-        # the current message.
-        inputs = {"messages": history.messages}
+        # Blocking DB work runs off the event loop
+        new_message = await asyncio.to_thread(_prepare_turn, history, request)
+        turn_revision = history.revision
+
+        agent = get_agent_executor(request.model_name, use_checkpointer=True)
+        thread_id = f"{request.user_id}:{request.chat_id}"
         config = {
-            "configurable": {"thread_id": f"{request.user_id}:{request.chat_id}"},
+            "configurable": {"thread_id": thread_id},
             "metadata": {
                 "user_id": request.user_id,
                 "chat_id": request.chat_id,
@@ -137,6 +169,7 @@ async def chat_endpoint(request: ChatRequest):
             },
             "tags": ["chat", "agent", request.model_name]
         }
+        inputs = await asyncio.to_thread(_build_inputs, history, thread_id, new_message, [])
 
         final_response = ""
         tool_logs: list[ToolCallLog] = []
@@ -144,15 +177,16 @@ async def chat_endpoint(request: ChatRequest):
 
         ui_events.append(UIEvent(type="thinking", message="Thinking..."))
 
-        for event in agent.stream(inputs, config=config, stream_mode="updates"):
-            logger.info(f"Agent Event: {event}")
+        # Persisted in one batch once the run completes
+        messages_to_persist = []
+
+        async for event in agent.astream(inputs, config=config, stream_mode="updates"):
+            logger.debug("Agent Event: %s", event)
 
             for _, content in event.items():
                 if "messages" not in content:
                     continue
 
-                messages_to_persist = []
-
                 for msg in content["messages"]:
                     # Don't duplicate the already-persisted user message
                     if isinstance(msg, HumanMessage):
@@ -173,7 +207,7 @@ async def chat_endpoint(request: ChatRequest):
                                         data={"args": tool_args},
                                     )
                                 )
-                                logger.info(f"Tool Call: {tool_name} with args: {tool_args}")
+                                logger.info("Tool Call: %s with args: %s", tool_name, tool_args)
 
                         # Plain assistant content (can be intermediate step or final)
                         if msg.content:
@@ -186,7 +220,7 @@ async def chat_endpoint(request: ChatRequest):
                                     data={"text_preview": text[:200]},
                                 )
                             )
-                            logger.info(f"AI Response Step: {text[:100]}...")
+                            logger.info("AI Response Step: %.100s...", text)
 
                     # Tool results
                     if isinstance(msg, ToolMessage):
@@ -210,16 +244,17 @@ async def chat_endpoint(request: ChatRequest):
                             )
                         )
 
-                        logger.info(f"Tool Output ({tool_name}): {tool_out[:100]}...")
+                        logger.info("Tool Output (%s): %.100s...", tool_name, tool_out)
 
                     messages_to_persist.append(msg)
 
-                if messages_to_persist:
-                    history.add_messages(messages_to_persist)
+        if messages_to_persist:
+            await asyncio.to_thread(history.add_messages, messages_to_persist)
+            CHAT_THREADS.mark_synced(thread_id, turn_revision, history.revision)
 
         ui_events.append(UIEvent(type="done", message="Done."))
 
-        chat_pk = get_chat_pk(request.user_id, request.chat_id)
+        chat_pk = history.chat_pk
 
         return ChatResponse(
             response=final_response,
@@ -234,7 +269,7 @@ async def chat_endpoint(request: ChatRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/chat/stream")
-@traceable(
+@maybe_traceable(
     name="chat_stream_endpoint",
     tags=["chat", "stream", "agent", "lang-chain-mc"],
     metadata={"endpoint": "/agent/chat/stream"}
@@ -246,24 +281,14 @@ async def chat_stream_endpoint(request: ChatRequest):
     """
     try:
         history = get_session_history(request.user_id, request.chat_id)
-        
-        if request.message_index is not None:
-            if isinstance(history, PersistentChatMessageHistory):
-                history.update_message(request.message_index, request.message)
-                history.delete_message_after(request.message_index + 1)
-        else:
-            history.add_message(HumanMessage(content=request.message))
-
-        agent = get_agent_executor(request.model_name)
+        # Blocking DB work runs off the event loop
+        new_message = await asyncio.to_thread(_prepare_turn, history, request)
+        turn_revision = history.revision
 
-        # Inject reasoning instruction without persisting it
-        # Note: In LangGraph, we can pass the system message in the first turn.
-        # Checkpointer will remember previous messages, so we only need to pass
-        # the NEW human message if thread exists, but passing full history
-        # is also fine as LangGraph's default message state handles it.
-        inputs = {"messages": [SystemMessage(content=REASONING_INSTRUCTION)] + history.messages}
+        agent = get_agent_executor(request.model_name, use_checkpointer=True)
+        thread_id = f"{request.user_id}:{request.chat_id}"
         config = {
-            "configurable": {"thread_id": f"{request.user_id}:{request.chat_id}"},
+            "configurable": {"thread_id": thread_id},
             "metadata": {
                 "user_id": request.user_id,
                 "chat_id": request.chat_id,
@@ -272,26 +297,33 @@ async def chat_stream_endpoint(request: ChatRequest):
             },
             "tags": ["chat", "stream", "agent", request.model_name]
         }
+        # Inject reasoning instruction without persisting it; when the thread
+        # is resumed from the checkpointer it is already in the thread state.
+        inputs = await asyncio.to_thread(
+            _build_inputs, history, thread_id, new_message, [SystemMessage(content=REASONING_INSTRUCTION)]
+        )
 
         def sse(event: dict) -> bytes:
-            return f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8")
+            # orjson emits UTF-8 bytes directly, so frames need no extra encode
+            return b"data: " + orjson.dumps(event) + b"\n\n"
 
-        def event_generator():
+        async def event_generator():
             final_response = ""
             tool_logs: list[ToolCallLog] = []
 
+            # Persisted in one batch once the run completes
+            messages_to_persist = []
+
             yield sse({"type": "thinking", "message": "Thinking..."})
 
             try:
-                for event in agent.stream(inputs, config=config, stream_mode="updates"):
-                    logger.info(f"Agent Event: {event}")
+                async for event in agent.astream(inputs, config=config, stream_mode="updates"):
+                    logger.debug("Agent Event: %s", event)
 
                     for _, content in event.items():
                         if "messages" not in content:
                             continue
 
-                        messages_to_persist = []
-
                         for msg in content["messages"]:
                             if isinstance(msg, HumanMessage):
                                 continue
@@ -359,10 +391,11 @@ async def chat_stream_endpoint(request: ChatRequest):
 
                             messages_to_persist.append(msg)
 
-                        if messages_to_persist:
-                            history.add_messages(messages_to_persist)
+                if messages_to_persist:
+                    await asyncio.to_thread(history.add_messages, messages_to_persist)
+                    CHAT_THREADS.mark_synced(thread_id, turn_revision, history.revision)
 
-                chat_pk = get_chat_pk(request.user_id, request.chat_id)
+                chat_pk = history.chat_pk
                 yield sse(
                     {
                         "type": "done",
@@ -392,8 +425,8 @@ async def chat_stream_endpoint(request: ChatRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.delete("/history")
-async def delete_history(user_id: str, chat_id: str):
+@router.delete("/history", response_model=StatusResponse)
+def delete_history(user_id: str, chat_id: str):
     """Deletes chat history."""
     clear_history(user_id, chat_id)
     return {"status": "History cleared"}
\ No newline at end of file
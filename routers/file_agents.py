@@ -1,9 +1,11 @@
 """
 FastAPI router for file agent endpoints.
 """
+import asyncio
+
 from fastapi import APIRouter, HTTPException
 from langchain_core.messages import HumanMessage
-from langsmith import traceable
+from utils.helpers.tracing import maybe_traceable
 
 from agents.file_agents import get_file_creation_agent, get_file_editing_agent
 from schemas.file_agent_schemas import (
@@ -12,18 +14,17 @@ from schemas.file_agent_schemas import (
     FileAgentResponse,
     FileReadResponse,
 )
-from tools.file_tools import read_file_func
+from tools.file_tools import read_file_func_async
 import logging
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
+# Logging is configured once in main.py
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
 @router.post("/create", response_model=FileAgentResponse)
-@traceable(
+@maybe_traceable(
     name="file_creation_endpoint",
     tags=["file-agents", "file-creation", "lang-chain-mc"],
     metadata={"endpoint": "/file-agents/create"}
@@ -36,10 +37,11 @@ async def trigger_file_creation(request: FileCreationRequest):
     based on user requests.
     """
     try:
-        agent = get_file_creation_agent()
+        agent = get_file_creation_agent(use_plan_cache=True)
         
-        # Invoke agent with user task
-        result = agent.invoke({
+        # Invoke agent with user task; the blocking run goes to a worker thread
+        # (to_thread copies the context, so traces still nest under this endpoint)
+        result = await asyncio.to_thread(agent.invoke, {
             "messages": [HumanMessage(content=request.task)]
         })
         
@@ -47,13 +49,14 @@ async def trigger_file_creation(request: FileCreationRequest):
         output = None
         if isinstance(result, dict) and "messages" in result:
             last_message = result["messages"][-1]
-            output = last_message.content if hasattr(last_message, "content") else str(last_message)
+            # str() keeps the response type exact for model_construct below
+            output = str(last_message.content) if hasattr(last_message, "content") else str(last_message)
         else:
             output = str(result)
         
-        logger.info(f"File creation agent executed successfully. Output: {output[:200]}...")
+        logger.info("File creation agent executed successfully. Output: %.200s...", output)
         
-        return FileAgentResponse(
+        return FileAgentResponse.model_construct(
             success=True,
             message="File creation agent executed successfully",
             output=output
@@ -67,7 +70,7 @@ async def trigger_file_creation(request: FileCreationRequest):
 
 
 @router.post("/edit", response_model=FileAgentResponse)
-@traceable(
+@maybe_traceable(
     name="file_editing_endpoint",
     tags=["file-agents", "file-editing", "lang-chain-mc"],
     metadata={"endpoint": "/file-agents/edit"}
@@ -80,10 +83,11 @@ async def trigger_file_editing(request: FileEditingRequest):
     and updates them according to user instructions.
     """
     try:
-        agent = get_file_editing_agent()
+        agent = get_file_editing_agent(use_plan_cache=True)
         
-        # Invoke agent with user task
-        result = agent.invoke({
+        # Invoke agent with user task; the blocking run goes to a worker thread
+        # (to_thread copies the context, so traces still nest under this endpoint)
+        result = await asyncio.to_thread(agent.invoke, {
             "messages": [HumanMessage(content=request.task)]
         })
         
@@ -91,13 +95,14 @@ async def trigger_file_editing(request: FileEditingRequest):
         output = None
         if isinstance(result, dict) and "messages" in result:
             last_message = result["messages"][-1]
-            output = last_message.content if hasattr(last_message, "content") else str(last_message)
+            # str() keeps the response type exact for model_construct below
+            output = str(last_message.content) if hasattr(last_message, "content") else str(last_message)
         else:
             output = str(result)
         
-        logger.info(f"File editing agent executed successfully. Output: {output[:200]}...")
+        logger.info("File editing agent executed successfully. Output: %.200s...", output)
         
-        return FileAgentResponse(
+        return FileAgentResponse.model_construct(
             success=True,
             message="File editing agent executed successfully",
             output=output
@@ -111,7 +116,7 @@ async def trigger_file_editing(request: FileEditingRequest):
 
 
 @router.get("/files/{filename}", response_model=FileReadResponse)
-@traceable(
+@maybe_traceable(
     name="file_read_endpoint",
     tags=["file-agents", "file-read", "lang-chain-mc"],
     metadata={"endpoint": "/file-agents/files/{filename}"}
@@ -124,26 +129,26 @@ async def read_file(filename: str):
         filename: Name of the file to read (e.g., "summary.md")
     """
     try:
-        content = read_file_func(filename)
+        content = await read_file_func_async(filename)
         
         # Check if read_file_func returned an error message
         if content.startswith("Error:"):
-            return FileReadResponse(
+            return FileReadResponse.model_construct(
                 success=False,
                 content=None,
                 error=content
             )
         
-        logger.info(f"File read successfully: {filename}")
+        logger.info("File read successfully: %s", filename)
         
-        return FileReadResponse(
+        return FileReadResponse.model_construct(
             success=True,
             content=content,
             error=None
         )
     except Exception as e:
-        logger.exception(f"Error occurred while reading file: {filename}")
-        return FileReadResponse(
+        logger.exception("Error occurred while reading file: %s", filename)
+        return FileReadResponse.model_construct(
             success=False,
             content=None,
             error=f"Error occurred while reading file: {str(e)}"
@@ -54,4 +54,8 @@ class ChatHistoryResponse(BaseModel):
     user_id: str
     chat_id: str
     chat_pk: Optional[int] = None
-    messages: List[HistoryMessage]
\ No newline at end of file
+    messages: List[HistoryMessage]
+    next_cursor: Optional[str] = Field(None, description="Pass as `cursor` to fetch the next page; None on the last page")
+
+class StatusResponse(BaseModel):
+    status: str
@@ -1,4 +1,5 @@
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import partial
 from typing import Optional, List
 from pydantic import BaseModel, Field
 
@@ -14,7 +15,7 @@ class CodeExecutionResult(BaseModel):
     returncode: int = Field(..., description="Exit code")
     created_files: List[str] = Field(default_factory=list, description="List of created file names")
     execution_time: Optional[float] = Field(None, description="Execution time in seconds")
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=partial(datetime.now, timezone.utc))
 
     class Config:
         from_attributes = True
@@ -30,7 +31,7 @@ class WorkspaceFile(BaseModel):
     file_type: str = Field(..., description="File extension/type")
     description: Optional[str] = Field(None, description="File description/purpose")
     execution_id: Optional[int] = Field(None, description="Related execution ID")
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=partial(datetime.now, timezone.utc))
 
     class Config:
         from_attributes = True
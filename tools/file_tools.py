@@ -2,6 +2,7 @@
 LangChain tools for file operations in the workspace.
 These tools work on the shared workspace directory.
 """
+import asyncio
 from pathlib import Path
 from typing import Literal
 from langchain_core.tools import tool
@@ -73,10 +74,9 @@ def update_file_func(filename: str, content: str, mode: Literal["overwrite", "ap
     
     try:
         if mode == "append":
-            # Read existing content and append new content
-            existing_content = file_path.read_text(encoding="utf-8")
-            new_content = existing_content + "\n\n" + content
-            file_path.write_text(new_content, encoding="utf-8")
+            # Write only the new content after the existing bytes
+            with file_path.open("a", encoding="utf-8") as f:
+                f.write("\n\n" + content)
             return f"File updated successfully (append): {file_path}"
         else:
             # Overwrite mode
@@ -86,6 +86,25 @@ def update_file_func(filename: str, content: str, mode: Literal["overwrite", "ap
         return f"Error: Could not update file: {str(e)}"
 
 
+# Async variants (for async routes): the same functions, run in a worker
+# thread so disk I/O doesn't block the event loop
+async def create_file_func_async(filename: str, content: str) -> str:
+    """Async `create_file_func`."""
+    return await asyncio.to_thread(create_file_func, filename, content)
+
+
+async def read_file_func_async(filename: str) -> str:
+    """Async `read_file_func`."""
+    return await asyncio.to_thread(read_file_func, filename)
+
+
+async def update_file_func_async(
+    filename: str, content: str, mode: Literal["overwrite", "append"] = "overwrite"
+) -> str:
+    """Async `update_file_func`."""
+    return await asyncio.to_thread(update_file_func, filename, content, mode)
+
+
 # LangChain tools (for agents - with @tool decorator)
 @tool
 def create_file(filename: str, content: str) -> str:
@@ -139,15 +158,17 @@ def update_file(filename: str, content: str, mode: Literal["overwrite", "append"
     return update_file_func(filename, content, mode)
 
 
-# Export all tools as a list (for agents)
-FILE_TOOLS = [create_file, read_file, update_file]
+# Export all tools (for agents); a tuple so the shared instances can't be mutated
+FILE_TOOLS = (create_file, read_file, update_file)
 
 
 def get_file_tools():
     """
-    Returns a list of file operation tools for use in agents.
+    Returns the file operation tools for use in agents.
+
+    Always the same tool instances, so tool fingerprints stay stable.
     
     Returns:
-        List of LangChain tools for file operations
+        Tuple of LangChain tools for file operations
     """
     return FILE_TOOLS
@@ -1,14 +1,32 @@
+import atexit
+import io
 import os
-import uuid
-import tempfile
+import re
+import socket
+import threading
 import time
+from collections import OrderedDict
+from itertools import islice
 from pathlib import Path
 from typing import Optional
 
 import docker
-from docker.errors import DockerException, ContainerError, ImageNotFound
+from docker.errors import DockerException, ImageNotFound
+from docker.utils.socket import consume_socket_output, demux_adaptor, frames_iter
 from langchain_core.tools import tool
 
+try:
+    # Optional (Linux only): report created files from inotify events
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+try:
+    # Optional: scan submitted code against all patterns in one native pass
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
 from utils.settings import (
     WORKSPACE_DIR,
     SANDBOX_TIMEOUT,
@@ -16,6 +34,8 @@ from utils.settings import (
     SANDBOX_MEMORY_LIMIT,
     SANDBOX_CPU_QUOTA,
     SANDBOX_NETWORK_DISABLED,
+    SANDBOX_POOL_SIZE,
+    SANDBOX_POOL_MAX_USES,
 )
 from database.db import get_db
 from database.code_execution import ExecutionRepository, WorkspaceRepository
@@ -35,6 +55,57 @@ BLOCKED_PATTERNS = [
     "open(",  # Will be allowed only via our safe wrapper
 ]
 
+# Patterns rejected by _validate_code_safety, compiled into one alternation
+# so the code is scanned once however many patterns there are
+DANGEROUS_PATTERNS = ("__import__", "eval(", "exec(", "compile(")
+_DANGEROUS_RE = re.compile("|".join(map(re.escape, DANGEROUS_PATTERNS)))
+_PATH_TRAVERSAL_RE = re.compile(r"\.\./|/\.\.")
+
+
+def _compile_hyperscan():
+    """Compile the patterns above into one Hyperscan database (None if unavailable)"""
+    if hyperscan is None:
+        return None
+    expressions = [re.escape(pattern).encode() for pattern in DANGEROUS_PATTERNS]
+    expressions.append(_PATH_TRAVERSAL_RE.pattern.encode())
+    database = hyperscan.Database()
+    database.compile(
+        expressions=expressions,
+        ids=list(range(len(expressions))),
+        elements=len(expressions),
+        flags=[hyperscan.HS_FLAG_SINGLEMATCH] * len(expressions),
+    )
+    return database
+
+
+_HS_DATABASE = _compile_hyperscan()
+_HS_TRAVERSAL_ID = len(DANGEROUS_PATTERNS)
+# Hyperscan scratch space must not be shared by concurrent scans
+_HS_LOCAL = threading.local()
+
+
+def _scan_hyperscan(code: str) -> tuple[Optional[str], bool]:
+    """Return (first dangerous pattern or None, path traversal seen)"""
+    scratch = getattr(_HS_LOCAL, "scratch", None)
+    if scratch is None:
+        scratch = _HS_LOCAL.scratch = hyperscan.Scratch(_HS_DATABASE)
+
+    hits = {"dangerous": None, "traversal": False}
+
+    def on_match(pattern_id, start, end, flags, context):
+        if pattern_id == _HS_TRAVERSAL_ID:
+            hits["traversal"] = True
+            return False
+        hits["dangerous"] = DANGEROUS_PATTERNS[pattern_id]
+        # A dangerous pattern decides the result; stop scanning
+        return True
+
+    try:
+        _HS_DATABASE.scan(code.encode("utf-8", "surrogatepass"), match_event_handler=on_match, scratch=scratch)
+    except hyperscan.ScanTerminated:
+        pass
+    return hits["dangerous"], hits["traversal"]
+
 
 def _sanitize_output(output: str, max_length: int = SANDBOX_MAX_OUTPUT) -> str:
     """Truncate output if too long."""
@@ -50,30 +121,59 @@ def _validate_code_safety(code: str) -> tuple[bool, str]:
     Returns:
         tuple: (is_safe, error_message)
     """
-    # Check for obviously dangerous patterns
-    dangerous_patterns = ["__import__", "eval(", "exec(", "compile("]
+    if _HS_DATABASE is not None:
+        dangerous, traversal = _scan_hyperscan(code)
+        if dangerous:
+            return False, f"❌ Dangerous operation detected: {dangerous}"
+        if traversal:
+            return False, "❌ Path traversal detected"
+        return True, ""
 
-    for pattern in dangerous_patterns:
-        if pattern in code:
-            return False, f"❌ Dangerous operation detected: {pattern}"
+    # Check for obviously dangerous patterns
+    match = _DANGEROUS_RE.search(code)
+    if match:
+        return False, f"❌ Dangerous operation detected: {match.group()}"
 
     # Check for path traversal
-    if "../" in code or "/.." in code:
+    if _PATH_TRAVERSAL_RE.search(code):
         return False, "❌ Path traversal detected"
 
     return True, ""
 
 
+# Shared Docker client and "image is present" flag, set on first success
+_DOCKER_CLIENT: Optional[docker.DockerClient] = None
+_DOCKER_CLIENT_LOCK = threading.Lock()
+_IMAGE_VERIFIED = False
+
+
+def _get_docker_client() -> docker.DockerClient:
+    """Return the process-wide Docker client, connecting on first use"""
+    global _DOCKER_CLIENT
+    if _DOCKER_CLIENT is None:
+        with _DOCKER_CLIENT_LOCK:
+            if _DOCKER_CLIENT is None:
+                _DOCKER_CLIENT = docker.from_env()
+    return _DOCKER_CLIENT
+
+
 def _ensure_docker_image():
     """
     Ensure Docker image exists, build if not.
+
+    Checked against the daemon once per process; later calls return early.
     """
+    global _IMAGE_VERIFIED
+    if _IMAGE_VERIFIED:
+        return True, "Image exists"
+
     try:
-        client = docker.from_env()
+        client = _get_docker_client()
 
         # Check if image exists
         try:
             client.images.get(SANDBOX_IMAGE)
+            _IMAGE_VERIFIED = True
             return True, "Image exists"
         except ImageNotFound:
             # Build image from Dockerfile.sandbox
@@ -89,68 +189,174 @@ def _ensure_docker_image():
                 tag=SANDBOX_IMAGE,
                 rm=True,
             )
+            _IMAGE_VERIFIED = True
             return True, "Image built successfully"
 
     except DockerException as e:
         return False, f"❌ Docker error: {str(e)}"
 
 
-def _execute_in_docker(code: str, script_path: Path) -> dict:
+# ==================== Warm Container Pool ====================
+
+# session_id -> idle (container, uses). Containers are never shared across
+# sessions; beyond SANDBOX_POOL_SIZE idle containers the least recently used
+# session's container is discarded.
+_POOL: "OrderedDict[str, tuple]" = OrderedDict()
+_POOL_LOCK = threading.Lock()
+_LIVE_CONTAINERS = set()
+_LIVE_LOCK = threading.Lock()
+
+# Settings are fixed for the process, so the run kwargs are built once
+_WORKSPACE_ABS = str(WORKSPACE_DIR.absolute())
+_CONTAINER_CONFIG = {
+    "image": SANDBOX_IMAGE,
+    "command": ["sleep", "infinity"],
+    "volumes": {_WORKSPACE_ABS: {"bind": "/workspace", "mode": "rw"}},
+    "working_dir": "/workspace",
+    "mem_limit": SANDBOX_MEMORY_LIMIT,
+    "cpu_quota": SANDBOX_CPU_QUOTA,
+    "cpu_period": 100000,
+    "network_disabled": SANDBOX_NETWORK_DISABLED,
+    "auto_remove": True,
+    "detach": True,
+}
+
+
+def _start_pooled_container(client):
+    """Start an idle sandbox container that waits for exec calls"""
+    container = client.containers.run(**_CONTAINER_CONFIG)
+    with _LIVE_LOCK:
+        _LIVE_CONTAINERS.add(container)
+    return container
+
+
+def _discard_container(container) -> None:
+    with _LIVE_LOCK:
+        _LIVE_CONTAINERS.discard(container)
+    try:
+        # auto_remove deletes it once stopped
+        container.stop(timeout=0)
+    except DockerException:
+        pass
+
+
+# Run before a container goes back to the pool: kills whatever the last run
+# left running (kill(-1) spares PID 1 and the caller) and empties the
+# writable scratch locations. /workspace is the shared mount and is kept.
+_RESET_SCRIPT = """
+import glob, os, shutil, signal
+os.kill(-1, signal.SIGKILL)
+for root in ("/tmp", "/var/tmp", os.path.expanduser("~")):
+    for path in glob.glob(os.path.join(root, "*")) + glob.glob(os.path.join(root, ".*")):
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.unlink(path)
+"""
+
+
+def _acquire_container(client, session_id: str) -> tuple:
+    with _POOL_LOCK:
+        pooled = _POOL.pop(session_id, None)
+    if pooled is not None:
+        return pooled
+    return _start_pooled_container(client), 0
+
+
+def _reset_container(container) -> bool:
+    try:
+        return container.exec_run(["python", "-c", _RESET_SCRIPT]).exit_code == 0
+    except DockerException:
+        return False
+
+
+def _release_container(container, session_id: str, uses: int, healthy: bool) -> None:
+    """Return a reset container to its session's pool slot, or retire it when worn out or suspect"""
+    if (
+        not healthy
+        or uses >= SANDBOX_POOL_MAX_USES
+        or SANDBOX_POOL_SIZE <= 0
+        or not _reset_container(container)
+    ):
+        _discard_container(container)
+        return
+
+    evicted = []
+    with _POOL_LOCK:
+        if session_id in _POOL:
+            # A concurrent run of this session returned its container first
+            evicted.append(container)
+        else:
+            _POOL[session_id] = (container, uses)
+            while len(_POOL) > SANDBOX_POOL_SIZE:
+                evicted.append(_POOL.popitem(last=False)[1][0])
+    for old_container in evicted:
+        _discard_container(old_container)
+
+
+@atexit.register
+def _shutdown_pool() -> None:
+    with _LIVE_LOCK:
+        containers = list(_LIVE_CONTAINERS)
+    for container in containers:
+        _discard_container(container)
+
+
+def _exec_with_stdin(client, container, cmd: list, stdin: bytes) -> tuple:
     """
-    Execute code in Docker container.
+    Run cmd in container, write stdin and close it; returns (exit_code, stdout, stderr).
 
-    Returns:
-        dict with stdout, stderr, returncode
+    exec_run can't feed stdin, so this drives the exec API directly and
+    demultiplexes the attached stream the same way docker-py does.
     """
+    exec_id = client.api.exec_create(container.id, cmd, stdin=True, workdir="/workspace")["Id"]
+    sock = client.api.exec_start(exec_id, socket=True)
+    raw = getattr(sock, "_sock", sock)
     try:
-        client = docker.from_env()
-
-        # Prepare volumes
-        volumes = {
-            str(WORKSPACE_DIR.absolute()): {
-                "bind": "/workspace",
-                "mode": "rw"
-            },
-            str(script_path): {
-                "bind": "/tmp/script.py",
-                "mode": "ro"
-            }
-        }
+        raw.sendall(stdin)
+        # EOF on stdin: `python -` starts running the program
+        raw.shutdown(socket.SHUT_WR)
+        frames = (demux_adaptor(*frame) for frame in frames_iter(raw, tty=False))
+        stdout, stderr = consume_socket_output(frames, demux=True)
+    finally:
+        sock.close()
+    exit_code = client.api.exec_inspect(exec_id)["ExitCode"]
+    return exit_code, stdout, stderr
 
-        # Container configuration
-        container_config = {
-            "image": SANDBOX_IMAGE,
-            "command": ["python", "/tmp/script.py"],
-            "volumes": volumes,
-            "working_dir": "/workspace",
-            "mem_limit": SANDBOX_MEMORY_LIMIT,
-            "cpu_quota": SANDBOX_CPU_QUOTA,
-            "cpu_period": 100000,
-            "network_disabled": SANDBOX_NETWORK_DISABLED,
-            "remove": True,
-            "detach": False,
-            "stdout": True,
-            "stderr": True,
-        }
 
-        # Run container
-        try:
-            output = client.containers.run(**container_config)
+def _execute_in_docker(code: str, session_id: str) -> dict:
+    """
+    Execute code in a sandbox container; the code is piped to `python -`.
 
-            return {
-                "stdout": output.decode("utf-8") if isinstance(output, bytes) else output,
-                "stderr": "",
-                "returncode": 0
-            }
+    With SANDBOX_POOL_SIZE=0 (the default) every run gets a fresh container
+    that is removed afterwards. Otherwise a session reuses its own warm
+    container, reset between runs. `timeout` enforces SANDBOX_TIMEOUT per run.
 
-        except ContainerError as e:
+    Returns:
+        dict with stdout, stderr, returncode
+    """
+    try:
+        client = _get_docker_client()
+        container, uses = _acquire_container(client, session_id)
+        healthy = False
+        try:
+            exit_code, stdout, stderr = _exec_with_stdin(
+                client,
+                container,
+                ["timeout", str(SANDBOX_TIMEOUT), "python", "-"],
+                code.encode("utf-8"),
+            )
+            # 124/137: timed out or killed (e.g. OOM); don't reuse that container
+            healthy = exit_code not in (124, 137)
             return {
-                "stdout": e.stdout.decode("utf-8") if e.stdout else "",
-                "stderr": e.stderr.decode("utf-8") if e.stderr else str(e),
-                "returncode": e.exit_status
+                "stdout": stdout.decode("utf-8", errors="replace") if stdout else "",
+                "stderr": stderr.decode("utf-8", errors="replace") if stderr else "",
+                "returncode": exit_code,
             }
+        finally:
+            _release_container(container, session_id, uses + 1, healthy)
 
-    except DockerException as e:
+    except (DockerException, OSError) as e:
         return {
             "stdout": "",
             "stderr": f"Docker execution error: {str(e)}",
@@ -158,28 +364,66 @@ def _execute_in_docker(code: str, script_path: Path) -> dict:
         }
 
 
-def _save_file_metadata(session_id: str, filename: str, execution_id: Optional[int] = None):
-    """Save file metadata to database"""
+class _NewFileTracker:
+    """
+    Names created directly in WORKSPACE_DIR while the tracker is active.
+
+    With inotify_simple installed, this watches CREATE/MOVED_TO events, so
+    the cost follows the number of new files rather than the workspace
+    size. This needs bind-mount writes to reach the host kernel, as with
+    native Docker on Linux. Otherwise it falls back to diffing two
+    directory listings.
+    """
+
+    def __init__(self):
+        self._inotify = None
+        self._before = None
+
+    def __enter__(self):
+        if INotify is not None and WORKSPACE_DIR.exists():
+            try:
+                self._inotify = INotify()
+                self._inotify.add_watch(str(WORKSPACE_DIR), inotify_flags.CREATE | inotify_flags.MOVED_TO)
+                return self
+            except OSError:
+                self._close()
+        self._before = set(os.listdir(WORKSPACE_DIR)) if WORKSPACE_DIR.exists() else set()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._close()
+
+    def _close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def new_files(self) -> list:
+        if self._inotify is not None:
+            names = dict.fromkeys(event.name for event in self._inotify.read(timeout=0) if event.name)
+            # Skip files that were created and removed again during the run
+            return [name for name in names if (WORKSPACE_DIR / name).exists()]
+        files_after = set(os.listdir(WORKSPACE_DIR)) if WORKSPACE_DIR.exists() else set()
+        return list(files_after - self._before)
+
+
+def _file_metadata_row(session_id: str, filename: str, execution_id: Optional[int] = None) -> Optional[dict]:
+    """Build a workspace file metadata row, or None if the file is gone"""
+    file_path = WORKSPACE_DIR / filename
+    # One stat both checks existence and gives the size
     try:
-        file_path = WORKSPACE_DIR / filename
-        if not file_path.exists():
-            return
-        
         file_size = file_path.stat().st_size
-        file_type = file_path.suffix.lstrip('.') or 'unknown'
-        
-        with get_db() as db:
-            WorkspaceRepository.save_file_metadata(
-                db=db,
-                session_id=session_id,
-                filename=filename,
-                file_path=str(file_path.relative_to(WORKSPACE_DIR)),
-                file_size=file_size,
-                file_type=file_type,
-                execution_id=execution_id
-            )
-    except Exception as e:
-        print(f"Warning: Failed to save file metadata: {e}")
+    except FileNotFoundError:
+        return None
+
+    return {
+        "session_id": session_id,
+        "filename": filename,
+        "file_path": filename,
+        "file_size": file_size,
+        "file_type": file_path.suffix.lstrip('.') or 'unknown',
+        "execution_id": execution_id,
+    }
 
 
 @tool
@@ -236,7 +480,61 @@ plt.savefig("/workspace/plot.png")
 print("Plot created")
 '''
     """
+    return _run_code(code, session_id)
+
+
+# Prepended to run_numeric_code snippets (one line, so tracebacks stay one line off)
+NUMBA_PREAMBLE = "from numba import njit, prange\n"
+
+
+@tool
+def run_numeric_code(code: str, session_id: str = "default") -> str:
+    """
+    Execute CPU-heavy numeric Python code in the Docker sandbox with Numba available.
+
+    Same sandbox, limits and result reporting as run_python_code, but
+    `njit` and `prange` are already imported. Decorate hot numeric loops
+    with @njit (or @njit(parallel=True) with prange) to compile them to
+    machine code; 10-100x faster for plain loops over numbers and numpy
+    arrays. Use run_python_code for everything else (plots, pandas, I/O).
+
+    Important:
+    - Jitted functions take and return numbers / numpy arrays only
+    - Do not pass cache=True (the code is not read from a file)
+    - Use print() to output results
+
+    Args:
+        code: Python code to execute
+        session_id: Session identifier for tracking (default: "default")
+
+    Returns:
+        str: Execution result containing stdout, stderr, and list of created files
+
+    Example:
+        code = '''
+import numpy as np
+
+@njit
+def pairwise_sum(a):
+    total = 0.0
+    for i in range(a.shape[0]):
+        for j in range(a.shape[0]):
+            total += abs(a[i] - a[j])
+    return total
+
+print(pairwise_sum(np.random.rand(5000)))
+'''
+    """
+    return _run_code(code, session_id, preamble=NUMBA_PREAMBLE)
+
+
+def _run_code(code: str, session_id: str, preamble: str = "") -> str:
+    """
+    Shared body of the sandbox tools: validate, execute, record, report.
 
+    Only the user's code is validated and stored; the preamble is added
+    just before execution.
+    """
     # Start timing
     start_time = time.time()
 
@@ -250,28 +548,17 @@ print("Plot created")
     if not image_ok:
         return f"{image_msg}\n\nPlease ensure Docker is installed and Dockerfile.sandbox exists."
 
-    # Track files before execution
-    files_before = set(os.listdir(WORKSPACE_DIR)) if WORKSPACE_DIR.exists() else set()
-
-    # Create temporary script file
-    script_id = uuid.uuid4().hex[:8]
-    script_path = Path(tempfile.gettempdir()) / f"sandbox_script_{script_id}.py"
-
     try:
-        # Write script
-        script_path.write_text(code, encoding="utf-8")
-
-        # Execute in Docker
-        result = _execute_in_docker(code, script_path)
+        # Execute in Docker (code goes in over stdin, no script file),
+        # tracking the files it creates
+        with _NewFileTracker() as tracker:
+            result = _execute_in_docker(preamble + code, session_id)
+            new_files = tracker.new_files()
 
         stdout = result["stdout"].strip()
         stderr = result["stderr"].strip()
         returncode = result["returncode"]
 
-        # Track files after execution
-        files_after = set(os.listdir(WORKSPACE_DIR)) if WORKSPACE_DIR.exists() else set()
-        new_files = list(files_after - files_before)
-
         # Calculate execution time
         execution_time = time.time() - start_time
 
@@ -290,10 +577,10 @@ print("Plot created")
                     execution_time=execution_time
                 )
                 execution_id = execution.id
-                
-                # Save file metadata
-                for filename in new_files:
-                    _save_file_metadata(session_id, filename, execution_id)
+
+                # Save file metadata in one batch
+                file_rows = [_file_metadata_row(session_id, filename, execution_id) for filename in new_files]
+                WorkspaceRepository.save_file_metadata_bulk(db, [row for row in file_rows if row])
         except Exception as e:
             print(f"Warning: Failed to save execution to database: {e}")
 
@@ -313,7 +600,7 @@ print("Plot created")
 
         if new_files:
             response_parts.append(f"\n📁 Created files: {', '.join(sorted(new_files))}")
-            response_parts.append(f"📂 Files saved in: {WORKSPACE_DIR.absolute()}")
+            response_parts.append(f"📂 Files saved in: {_WORKSPACE_ABS}")
 
         response_parts.append(f"\n⏱️ Execution time: {execution_time:.2f}s")
         response_parts.append(f"💾 Results stored (ID: {execution_id})")
@@ -323,14 +610,6 @@ print("Plot created")
     except Exception as e:
         return f"💥 Execution error: {type(e).__name__}: {str(e)}"
 
-    finally:
-        # Cleanup temporary script
-        if script_path.exists():
-            try:
-                script_path.unlink()
-            except Exception:
-                pass
-
 
 @tool
 def list_workspace_files(session_id: str = "default") -> str:
@@ -346,25 +625,28 @@ def list_workspace_files(session_id: str = "default") -> str:
         str: List of files with their sizes and metadata
     """
     try:
-        # Get files from filesystem
+        # Get files from filesystem; scandir's entries carry the file type
+        # from the directory read, so only the size needs a stat call
+        with os.scandir(WORKSPACE_DIR) as it:
+            entries = sorted((entry for entry in it if entry.is_file()), key=lambda entry: entry.name)
+
         files = []
-        for item in sorted(WORKSPACE_DIR.iterdir()):
-            if item.is_file():
-                size = item.stat().st_size
-                size_str = f"{size:,} bytes" if size < 1024 else f"{size / 1024:.1f} KB"
-                files.append(f"  - {item.name} ({size_str})")
+        for entry in entries:
+            size = entry.stat().st_size
+            size_str = f"{size:,} bytes" if size < 1024 else f"{size / 1024:.1f} KB"
+            files.append(f"  - {entry.name} ({size_str})")
 
         if not files:
             return "📂 Workspace is empty."
 
-        result = f"📂 Workspace files:\n" + "\n".join(files) + f"\n\n📂 Path: {WORKSPACE_DIR.absolute()}"
+        result = f"📂 Workspace files:\n" + "\n".join(files) + f"\n\n📂 Path: {_WORKSPACE_ABS}"
 
         # Try to get metadata from database
         try:
             with get_db() as db:
-                file_metadata = WorkspaceRepository.get_session_files(db, session_id)
-                if file_metadata:
-                    result += f"\n\n💾 Database records: {len(file_metadata)} files tracked"
+                tracked = WorkspaceRepository.count_session_files(db, session_id)
+                if tracked:
+                    result += f"\n\n💾 Database records: {tracked} files tracked"
         except Exception as e:
             print(f"Warning: Could not fetch file metadata: {e}")
 
@@ -402,16 +684,21 @@ def read_workspace_file(filename: str, max_lines: int = 50) -> str:
         if size > 10 * 1024 * 1024:  # 10 MB
             return f"❌ File too large: {size / (1024 * 1024):.1f} MB (max 10 MB)"
 
-        # Try to read as text
+        # Try to read as text, stopping one line past max_lines
         try:
-            content = file_path.read_text(encoding="utf-8")
-            lines = content.splitlines()
+            with file_path.open("rb") as raw:
+                # NUL bytes in the first block: binary, don't decode any further
+                if b"\x00" in raw.read(4096):
+                    return f"❌ File is binary and cannot be displayed as text: {filename}"
+                raw.seek(0)
+                with io.TextIOWrapper(raw, encoding="utf-8") as f:
+                    lines = list(islice(f, max_lines + 1))
 
             if len(lines) > max_lines:
-                preview = "\n".join(lines[:max_lines])
-                return f"📄 {filename} (showing first {max_lines} of {len(lines)} lines):\n\n{preview}\n\n... (truncated)"
+                preview = "".join(lines[:max_lines]).rstrip("\n")
+                return f"📄 {filename} (showing first {max_lines} lines):\n\n{preview}\n\n... (truncated)"
             else:
-                return f"📄 {filename}:\n\n{content}"
+                return f"📄 {filename}:\n\n{''.join(lines)}"
 
         except UnicodeDecodeError:
             return f"❌ File is binary and cannot be displayed as text: {filename}"
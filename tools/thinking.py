@@ -2,7 +2,13 @@ from langchain_tavily import TavilySearch
 from langchain_core.tools import tool
 
 from utils.settings import TAVILY_API_KEY
-from tools.python_executor import run_python_code, list_workspace_files, read_workspace_file, get_execution_history
+from tools.python_executor import (
+    run_python_code,
+    run_numeric_code,
+    list_workspace_files,
+    read_workspace_file,
+    get_execution_history,
+)
 
 web_search_tool = TavilySearch(
     max_results=3,
@@ -21,12 +27,17 @@ def reasoning_tool(reasoning_summary: str):
     return reasoning_summary
 
 
+# Shared tool instances; a tuple so callers can't mutate the registry
+TOOLS = (
+    web_search_tool,
+    reasoning_tool,
+    run_python_code,
+    run_numeric_code,
+    list_workspace_files,
+    read_workspace_file,
+    get_execution_history,
+)
+
+
 def get_tools():
-    return [
-        web_search_tool,
-        reasoning_tool,
-        run_python_code,
-        list_workspace_files,
-        read_workspace_file,
-        get_execution_history,
-    ]
\ No newline at end of file
+    return TOOLS
\ No newline at end of file
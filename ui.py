@@ -1,8 +1,21 @@
 import os
+import queue
+import threading
+import time
 import uuid
 import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 import requests
 import streamlit as st
+from requests.adapters import HTTPAdapter
+
+try:
+    # Faster decoding of SSE events and API responses; the stdlib also takes bytes
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
 
 st.set_page_config(page_title="LangChain Agent Chat", layout="wide")
 st.title("LangChain Agentic System")
@@ -15,32 +28,222 @@ except Exception:
     API_BASE = os.environ.get("API_BASE", "http://localhost:8000")
 
 
+@st.cache_resource
+def _http() -> requests.Session:
+    """One pooled keep-alive session shared by every rerun and browser session"""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    return session
+
+
+@st.cache_resource
+def _pool() -> ThreadPoolExecutor:
+    """Shared worker threads for network calls that should not block rendering"""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="ui-fetch")
+
+
+@lru_cache(maxsize=256)
 def _history_key(user_id: str, chat_id: str) -> str:
     return f"messages::{user_id}::{chat_id}"
 
 
-def fetch_history(user_id: str, chat_id: str) -> list[dict]:
-    resp = requests.get(
-        f"{API_BASE}/agent/history",
-        params={"user_id": user_id, "chat_id": chat_id},
-        timeout=60,
-    )
-    resp.raise_for_status()
-    data = resp.json()
+def _future_key(history_key: str) -> str:
+    return f"_fut_{history_key}"
+
+
+# OpenRouter model ids offered in the sidebar (first one is the default)
+MODELS = (
+    "google/gemini-3-flash-preview",
+    "moonshotai/kimi-k2.5",
+    "openai/gpt-5.2",
+    "openai/gpt-3.5-turbo",
+    "openai/gpt-4-turbo",
+    "anthropic/claude-3-opus",
+    "google/gemini-pro-1.5",
+)
 
+HISTORY_PAGE_SIZE = 200
+# Events kept (and shown) per assistant message; older ones are dropped at store time
+TOOL_EVENTS_KEPT = 50
+DEBUG_EVENTS_KEPT = 100
+# History messages rendered per rerun; "Load older" grows the window by this much
+RENDER_WINDOW = 30
+# Chats per user remembered (and warmed on a new browser session)
+RECENT_CHATS_KEPT = 5
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _fetch_history_cached(user_id: str, chat_id: str, api_base: str) -> list[dict]:
     msgs: list[dict] = []
-    for m in data.get("messages", []):
-        role = m.get("role", "assistant")
-        content = m.get("content", "")
-        name = m.get("name")
-        index = m.get("index")
-        msg = {"role": role, "content": content}
-        if name:
-            msg["name"] = name
-        if index is not None:
-            msg["index"] = index
-        msgs.append(msg)
-    return msgs
+    cursor = None
+    while True:
+        params = {"user_id": user_id, "chat_id": chat_id, "limit": HISTORY_PAGE_SIZE}
+        if cursor:
+            params["cursor"] = cursor
+        resp = _http().get(
+            f"{api_base}/agent/history",
+            params=params,
+            timeout=60,
+        )
+        resp.raise_for_status()
+        # requests asks for gzip by default and decompresses .content
+        data = json_loads(resp.content)
+
+        for m in data.get("messages", []):
+            role = m.get("role", "assistant")
+            content = m.get("content", "")
+            name = m.get("name")
+            index = m.get("index")
+            msg = {"role": role, "content": content}
+            if name:
+                msg["name"] = name
+            if index is not None:
+                msg["index"] = index
+            msgs.append(msg)
+
+        cursor = data.get("next_cursor")
+        if not cursor:
+            return msgs
+
+
+def fetch_history(user_id: str, chat_id: str) -> list[dict]:
+    # Deduplicates the GET across reruns; session_state stays the display copy
+    return _fetch_history_cached(user_id, chat_id, API_BASE)
+
+
+def invalidate_history(user_id: str, chat_id: str) -> None:
+    """Drop the cached history of a chat after anything that changes it"""
+    _fetch_history_cached.clear(user_id, chat_id, API_BASE)
+
+
+# Streamed answers are redrawn at most this often (seconds)
+STREAM_RENDER_INTERVAL = 0.05
+# Upper bound on SSE events applied between two redraws
+STREAM_BATCH_SIZE = 64
+_STREAM_END = object()
+_DATA_PREFIX = b"data: "
+_DATA_LEN = len(_DATA_PREFIX)
+# The answer being streamed, kept where the Stop callback can reach it
+_PARTIAL_KEY = "_stream_partial"
+
+
+def _read_sse(resp: requests.Response, events: queue.Queue, stop: threading.Event) -> None:
+    """Parse SSE `data:` lines from resp onto events (run in a background thread)"""
+    try:
+        # Lines stay bytes: the JSON decoder reads UTF-8 directly
+        for raw_line in resp.iter_lines():
+            if stop.is_set():
+                break
+            if not raw_line.startswith(_DATA_PREFIX):
+                continue
+            try:
+                events.put(json_loads(raw_line[_DATA_LEN:]))
+            except Exception:
+                continue
+    except Exception as e:
+        if not stop.is_set():
+            events.put(e)
+    finally:
+        events.put(_STREAM_END)
+
+
+def _next_events(events: queue.Queue) -> list:
+    """Block for the next event, then take whatever else is already queued"""
+    batch = [events.get()]
+    while len(batch) < STREAM_BATCH_SIZE:
+        try:
+            batch.append(events.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _reload_history(user_id: str, chat_id: str, *, force: bool = False) -> bool:
+    """
+    Load a chat's history into session state, reporting failures in place.
+
+    force bypasses the fetch cache so the server is always asked.
+    """
+    if force:
+        invalidate_history(user_id, chat_id)
+    try:
+        st.session_state[_history_key(user_id, chat_id)] = fetch_history(user_id, chat_id)
+        return True
+    except Exception as e:
+        st.error(f"Failed to load history: {e}")
+        return False
+
+
+def prefetch_history(user_id: str, chat_id: str) -> None:
+    """Start loading a chat's history in the background unless it is already loaded"""
+    k = _history_key(user_id, chat_id)
+    if k not in st.session_state and _future_key(k) not in st.session_state:
+        st.session_state[_future_key(k)] = _pool().submit(fetch_history, user_id, chat_id)
+
+
+@st.cache_resource
+def _recent_chats() -> tuple[threading.Lock, dict]:
+    """user_id -> most recently opened chat ids, shared by all browser sessions"""
+    return threading.Lock(), {}
+
+
+def remember_chat(user_id: str, chat_id: str) -> list[str]:
+    """Move chat_id to the front of the user's recent chats; returns a copy of the list"""
+    lock, recent_by_user = _recent_chats()
+    with lock:
+        recent = recent_by_user.setdefault(user_id, [])
+        if chat_id in recent:
+            recent.remove(chat_id)
+        recent.insert(0, chat_id)
+        del recent[RECENT_CHATS_KEPT:]
+        return list(recent)
+
+
+def prefetch_recent_chats(user_id: str, recent: list[str]) -> None:
+    """
+    Warm the fetch cache for the user's other recent chats, once per browser
+    session (e.g. after a page reload), so switching to one is a cache hit.
+    """
+    if st.session_state.get("_recent_warmed_for") == user_id:
+        return
+    st.session_state["_recent_warmed_for"] = user_id
+    for cid in recent[1:]:
+        if _history_key(user_id, cid) not in st.session_state:
+            # Fire and forget: the result lands in the st.cache_data cache
+            _pool().submit(fetch_history, user_id, cid)
+
+
+def _stop_generation() -> None:
+    """
+    on_click of the Stop button.
+
+    The click reruns the script, which interrupts the stream; this callback
+    runs first and keeps the partial answer in the chat history.
+    """
+    st.session_state.streaming = False
+    partial = st.session_state.pop(_PARTIAL_KEY, None)
+    if partial is None:
+        return
+    message = partial["message"]
+    message["content"] += " (Stopped)"
+    message["tool_events"] = message["tool_events"][-TOOL_EVENTS_KEPT:]
+    message["debug_events"] = message["debug_events"][-DEBUG_EVENTS_KEPT:]
+    st.session_state.setdefault(partial["key"], []).append(message)
+    invalidate_history(partial["user_id"], partial["chat_id"])
+    st.session_state["_generation_stopped"] = True
+
+
+def lazy_payload(data, key: str) -> None:
+    """
+    Show an event payload only after its checkbox is ticked.
+
+    Collapsed expanders still ship their content to the browser, so history
+    renders just the size and sends the JSON on demand.
+    """
+    payload = data if isinstance(data, str) else str(data)
+    if st.checkbox(f"payload ({len(payload):,} chars)", key=key):
+        st.code(payload, language="json")
 
 
 def _new_chat_id() -> str:
@@ -65,6 +268,7 @@ with st.sidebar:
     with col_a:
         if st.button("New Chat", use_container_width=True, key="btn_new_chat"):
             st.session_state["chat_id"] = _new_chat_id()
+            invalidate_history(st.session_state["user_id"], st.session_state["chat_id"])
             k = _history_key(st.session_state["user_id"], st.session_state["chat_id"])
             st.session_state[k] = []
             st.rerun()
@@ -72,12 +276,8 @@ with st.sidebar:
     with col_b:
         if st.button("Load Chat", use_container_width=True, key="btn_load_chat"):
             current_chat_id = st.session_state.get("chat_id", "chat_1")
-            k = _history_key(user_id, current_chat_id)
-            try:
-                st.session_state[k] = fetch_history(user_id, current_chat_id)
+            if _reload_history(user_id, current_chat_id):
                 st.success("Chat history loaded.")
-            except Exception as e:
-                st.error(f"Failed to load history: {e}")
 
     chat_id = st.text_input(
         "Chat ID",
@@ -85,10 +285,13 @@ with st.sidebar:
         key="input_chat_id",
     )
     st.session_state["chat_id"] = chat_id
+    # The GET runs while the rest of the sidebar renders
+    prefetch_history(user_id, chat_id)
+    prefetch_recent_chats(user_id, remember_chat(user_id, chat_id))
 
     model_name = st.selectbox(
         "Model Name",
-        ["google/gemini-3-flash-preview", "moonshotai/kimi-k2.5", "openai/gpt-5.2", "openai/gpt-3.5-turbo", "openai/gpt-4-turbo", "anthropic/claude-3-opus", "google/gemini-pro-1.5"],
+        MODELS,
         index=0,
         key="select_model_name",
     )
@@ -104,22 +307,19 @@ with st.sidebar:
     col_c, col_d = st.columns(2)
     with col_c:
         if st.button("Refresh History", use_container_width=True, key="btn_refresh_history"):
-            k = _history_key(user_id, chat_id)
-            try:
-                st.session_state[k] = fetch_history(user_id, chat_id)
+            if _reload_history(user_id, chat_id, force=True):
                 st.success("History refreshed.")
-            except Exception as e:
-                st.error(f"Failed to refresh: {e}")
 
     with col_d:
         if st.button("Clear Chat History", use_container_width=True, key="btn_clear_history"):
             try:
-                resp = requests.delete(
+                resp = _http().delete(
                     f"{API_BASE}/agent/history",
                     params={"user_id": user_id, "chat_id": chat_id},
                     timeout=60,
                 )
                 if resp.status_code == 200:
+                    invalidate_history(user_id, chat_id)
                     k = _history_key(user_id, chat_id)
                     st.session_state[k] = []
                     st.success("History cleared!")
@@ -137,8 +337,9 @@ with st.sidebar:
 key = _history_key(user_id, chat_id)
 if key not in st.session_state:
     st.session_state[key] = []
+    future = st.session_state.pop(_future_key(key), None)
     try:
-        st.session_state[key] = fetch_history(user_id, chat_id)
+        st.session_state[key] = future.result(timeout=60) if future else fetch_history(user_id, chat_id)
     except Exception:
         # API down or empty chat -> ignore
         st.session_state[key] = []
@@ -158,68 +359,104 @@ if "edit_triggered_prompt" not in st.session_state:
 if "edit_triggered_index" not in st.session_state:
     st.session_state.edit_triggered_index = None
 
-for i, message in enumerate(messages):
-    role = message.get("role", "assistant")
-    content = message.get("content", "")
-    msg_index = message.get("index", i)
-
-    with st.chat_message(role):
-        col1, col2 = st.columns([0.9, 0.1])
-        with col1:
-            # Hide the original content if currently editing this message
-            if not st.session_state.get(f"editing_{msg_index}"):
+def _set_editing(msg_index, editing: bool) -> None:
+    st.session_state[f"editing_{msg_index}"] = editing
+
+
+@st.fragment
+def render_history(messages: list[dict], key: str) -> None:
+    """
+    Chat history as a fragment: its widgets (edit, payload, load older)
+    rerun only this region, and clicks made while a response is streaming
+    wait for the stream instead of interrupting it.
+    """
+    # Only the newest messages are rendered; i stays the position in the full list
+    window_key = f"_render_window::{key}"
+    window = st.session_state.setdefault(window_key, RENDER_WINDOW)
+    first = max(0, len(messages) - window)
+    if first:
+        st.button(
+            f"Load older ({first} hidden)",
+            key="btn_load_older",
+            on_click=lambda: st.session_state.update({window_key: window + RENDER_WINDOW}),
+        )
+
+    for i, message in enumerate(messages[first:], start=first):
+        role = message.get("role", "assistant")
+        content = message.get("content", "")
+        msg_index = message.get("index", i)
+
+        with st.chat_message(role):
+            if role != "user":
+                # Nothing to edit: plain markdown, no column split
                 st.markdown(content)
 
-        # Only allow editing user messages for now
-        if role == "user":
-            with col2:
-                if st.button("📝", key=f"edit_{msg_index}"):
-                    st.session_state[f"editing_{msg_index}"] = True
-                    st.rerun()
-
-            if st.session_state.get(f"editing_{msg_index}"):
-                new_content = st.text_area("Edit message:", value=content, key=f"area_{msg_index}")
-                c1, c2 = st.columns(2)
-                with c1:
-                    if st.button("Save & Resend", key=f"save_{msg_index}"):
-                        # Update session state triggers
-                        st.session_state.edit_triggered_prompt = new_content
-                        st.session_state.edit_triggered_index = msg_index
-                        st.session_state[f"editing_{msg_index}"] = False
-
-                        # Refresh history in session state locally for immediate feedback before API call
-                        # (The chat block below will then use the provided index to update backend)
-                        st.rerun()
-                with c2:
-                    if st.button("Cancel", key=f"cancel_{msg_index}"):
-                        st.session_state[f"editing_{msg_index}"] = False
-                        st.rerun()
-
-        if role == "assistant":
-            reasoning_summary = message.get("reasoning_summary", "")
-            tool_events = message.get("tool_events", [])
-            debug_events = message.get("debug_events", [])
-
-            if show_reasoning and reasoning_summary:
-                with st.expander("Reasoning / Plan", expanded=False):
-                    st.markdown(reasoning_summary)
-
-            if show_tools and tool_events:
-                with st.expander("Tools", expanded=False):
-                    for ev in tool_events[-50:]:
-                        line = f"[{ev.get('type')}] {ev.get('message', '')}"
-                        if ev.get("tool"):
-                            line += f" (tool={ev.get('tool')})"
-                        st.write(line)
-                        if ev.get("data"):
-                            st.code(ev["data"], language="json")
+            # Only allow editing user messages for now
+            else:
+                col1, col2 = st.columns([0.9, 0.1])
+                with col1:
+                    # Hide the original content if currently editing this message
+                    if not st.session_state.get(f"editing_{msg_index}"):
+                        st.markdown(content)
+
+                with col2:
+                    # The click itself reruns the fragment; the callback runs first
+                    st.button(
+                        "📝",
+                        key=f"edit_{msg_index}",
+                        on_click=_set_editing,
+                        args=(msg_index, True),
+                    )
+
+                if st.session_state.get(f"editing_{msg_index}"):
+                    new_content = st.text_area("Edit message:", value=content, key=f"area_{msg_index}")
+                    c1, c2 = st.columns(2)
+                    with c1:
+                        if st.button("Save & Resend", key=f"save_{msg_index}"):
+                            # Update session state triggers
+                            st.session_state.edit_triggered_prompt = new_content
+                            st.session_state.edit_triggered_index = msg_index
+                            st.session_state[f"editing_{msg_index}"] = False
+
+                            # Refresh history in session state locally for immediate feedback before API call
+                            # (The chat block below will then use the provided index to update backend)
+                            st.rerun()
+                    with c2:
+                        st.button(
+                            "Cancel",
+                            key=f"cancel_{msg_index}",
+                            on_click=_set_editing,
+                            args=(msg_index, False),
+                        )
+
+            if role == "assistant":
+                reasoning_summary = message.get("reasoning_summary", "")
+                tool_events = message.get("tool_events", [])
+                debug_events = message.get("debug_events", [])
+
+                if show_reasoning and reasoning_summary:
+                    with st.expander("Reasoning / Plan", expanded=False):
+                        st.markdown(reasoning_summary)
 
-            if show_debug and debug_events:
-                with st.expander("Debug", expanded=False):
-                    for ev in debug_events[-100:]:
-                        st.write(f"[{ev.get('type')}] {ev.get('message', '')}")
-                        if ev.get("data"):
-                            st.code(ev["data"], language="json")
+                if show_tools and tool_events:
+                    with st.expander("Tools", expanded=False):
+                        for j, ev in enumerate(tool_events[-TOOL_EVENTS_KEPT:]):
+                            line = f"[{ev.get('type')}] {ev.get('message', '')}"
+                            if ev.get("tool"):
+                                line += f" (tool={ev.get('tool')})"
+                            st.write(line)
+                            if ev.get("data"):
+                                lazy_payload(ev["data"], key=f"payload_tools_{i}_{j}")
+
+                if show_debug and debug_events:
+                    with st.expander("Debug", expanded=False):
+                        for j, ev in enumerate(debug_events[-DEBUG_EVENTS_KEPT:]):
+                            st.write(f"[{ev.get('type')}] {ev.get('message', '')}")
+                            if ev.get("data"):
+                                lazy_payload(ev["data"], key=f"payload_debug_{i}_{j}")
+
+
+render_history(messages, key)
 
 
 # -----------------------
@@ -228,6 +465,8 @@ for i, message in enumerate(messages):
 # Handle stop button during streaming
 if "streaming" not in st.session_state:
     st.session_state.streaming = False
+if st.session_state.pop("_generation_stopped", False):
+    st.warning("Generation stopped by user.")
 
 prompt = st.chat_input("Type your message...", key="chat_input_prompt")
 
@@ -273,129 +512,172 @@ if prompt or edit_triggered_prompt:
         tool_events: list[dict] = []
         debug_events: list[dict] = []
 
+        # Panels are built on first use and then only the new tail of each
+        # event list is appended, instead of redrawing every event each time
+        panel_areas: dict = {}
+        rendered = {"reasoning": "", "tools": 0, "debug": 0}
+
+        def _panel(name: str, box, label: str):
+            if name not in panel_areas:
+                panel_areas[name] = box.expander(label, expanded=False)
+            return panel_areas[name]
+
         def render_panels_local():
-            if show_reasoning and reasoning_summary:
+            if show_reasoning and reasoning_summary and reasoning_summary != rendered["reasoning"]:
                 with reasoning_box.container():
                     with st.expander("Reasoning / Plan", expanded=True):
                         st.markdown(reasoning_summary)
+                rendered["reasoning"] = reasoning_summary
 
-            if show_tools and tool_events:
-                with tools_box.container():
-                    with st.expander("Tools", expanded=False):
-                        for ev in tool_events[-50:]:
-                            line = f"[{ev.get('type')}] {ev.get('message', '')}"
-                            if ev.get("tool"):
-                                line += f" (tool={ev.get('tool')})"
-                            st.write(line)
-                            if ev.get("data"):
-                                st.code(ev["data"], language="json")
+            if show_tools and len(tool_events) > rendered["tools"]:
+                with _panel("tools", tools_box, "Tools"):
+                    for ev in tool_events[rendered["tools"]:]:
+                        line = f"[{ev.get('type')}] {ev.get('message', '')}"
+                        if ev.get("tool"):
+                            line += f" (tool={ev.get('tool')})"
+                        st.write(line)
+                        if ev.get("data"):
+                            st.code(ev["data"], language="json")
+                rendered["tools"] = len(tool_events)
 
-            if show_debug and debug_events:
-                with debug_box.container():
-                    with st.expander("Debug", expanded=False):
-                        for ev in debug_events[-100:]:
-                            st.write(f"[{ev.get('type')}] {ev.get('message', '')}")
-                            if ev.get("data"):
-                                st.code(ev["data"], language="json")
+            if show_debug and len(debug_events) > rendered["debug"]:
+                with _panel("debug", debug_box, "Debug"):
+                    for ev in debug_events[rendered["debug"]:]:
+                        st.write(f"[{ev.get('type')}] {ev.get('message', '')}")
+                        if ev.get("data"):
+                            st.code(ev["data"], language="json")
+                rendered["debug"] = len(debug_events)
 
         st.session_state.streaming = True
-        stop_pressed = False
 
         try:
             if use_streaming:
-                with requests.post(
+                with _http().post(
                     f"{API_BASE}/agent/chat/stream",
                     json=payload,
                     stream=True,
                     timeout=300,
-                    headers={"Accept": "text/event-stream"},
+                    # Uncompressed, so every event can be read as soon as it arrives
+                    headers={"Accept": "text/event-stream", "Accept-Encoding": "identity"},
                 ) as resp:
                     resp.raise_for_status()
 
-                    for raw_line in resp.iter_lines(decode_unicode=True):
-                        # Check for stop button
-                        if stop_button_placeholder.button("Stop Generation", key=f"stop_{uuid.uuid4()}"):
-                            stop_pressed = True
-                            break
-
-                        if not raw_line:
-                            continue
-                        if not raw_line.startswith("data: "):
-                            continue
-
-                        data_str = raw_line[len("data: "):].strip()
-                        try:
-                            ev = json.loads(data_str)
-                        except Exception:
-                            continue
-
-                        ev_type = ev.get("type")
-
-                        if ev_type == "reasoning":
-                            summary = (ev.get("data") or {}).get("summary", "")
-                            if summary:
-                                reasoning_summary = summary
+                    partial = {
+                        "key": key,
+                        "user_id": user_id,
+                        "chat_id": chat_id,
+                        "message": {
+                            "role": "assistant",
+                            "content": "",
+                            "reasoning_summary": "",
+                            "tool_events": tool_events,
+                            "debug_events": debug_events,
+                        },
+                    }
+                    st.session_state[_PARTIAL_KEY] = partial
+
+                    # One stable widget; clicking it reruns the script, which
+                    # stops this loop and (via finally) the reader thread
+                    stop_button_placeholder.button("Stop Generation", key="stop_btn", on_click=_stop_generation)
+
+                    events: queue.Queue = queue.Queue()
+                    stop_reading = threading.Event()
+                    threading.Thread(
+                        target=_read_sse, args=(resp, events, stop_reading), daemon=True
+                    ).start()
+
+                    rendered_text = ""
+                    last_render = 0.0
+                    finished = False
+                    panels_dirty = False
+                    try:
+                        while not finished:
+                            for ev in _next_events(events):
+                                if ev is _STREAM_END:
+                                    finished = True
+                                    break
+                                if isinstance(ev, Exception):
+                                    raise ev
+
+                                ev_type = ev.get("type")
+
+                                if ev_type == "reasoning":
+                                    summary = (ev.get("data") or {}).get("summary", "")
+                                    if summary and summary != reasoning_summary:
+                                        reasoning_summary = summary
+                                        panels_dirty = True
+
+                                elif ev_type in ("tool_call", "tool_result"):
+                                    tool_events.append(
+                                        {
+                                            "type": ev_type,
+                                            "message": ev.get("message", ""),
+                                            "tool": ev.get("tool"),
+                                            "data": ev.get("data"),
+                                        }
+                                    )
+                                    panels_dirty = True
+
+                                elif ev_type == "assistant_delta":
+                                    acc_text += ev.get("delta", "")
+
+                                elif ev_type in ("thinking", "status", "done", "error"):
+                                    debug_events.append(
+                                        {
+                                            "type": ev_type,
+                                            "message": ev.get("message", ""),
+                                            "data": ev.get("data"),
+                                        }
+                                    )
+                                    panels_dirty = True
+
+                                    if ev_type in ("done", "error"):
+                                        finished = True
+                                        break
+
+                            partial["message"]["content"] = acc_text
+                            partial["message"]["reasoning_summary"] = reasoning_summary
+
+                            # Panels change rarely: redraw them once per batch that touched them
+                            if panels_dirty:
                                 render_panels_local()
+                                panels_dirty = False
 
-                        elif ev_type in ("tool_call", "tool_result"):
-                            tool_events.append(
-                                {
-                                    "type": ev_type,
-                                    "message": ev.get("message", ""),
-                                    "tool": ev.get("tool"),
-                                    "data": ev.get("data"),
-                                }
-                            )
-                            render_panels_local()
-
-                        elif ev_type == "assistant_delta":
-                            delta = ev.get("delta", "")
-                            acc_text += delta
-                            answer_box.markdown(acc_text)
-
-                        elif ev_type in ("thinking", "status", "done", "error"):
-                            debug_events.append(
-                                {
-                                    "type": ev_type,
-                                    "message": ev.get("message", ""),
-                                    "data": ev.get("data"),
-                                }
-                            )
-                            render_panels_local()
-
-                            if ev_type in ("done", "error"):
-                                break
+                            # Redraw the answer once per batch, and at a bounded rate
+                            now = time.monotonic()
+                            if acc_text != rendered_text and (finished or now - last_render >= STREAM_RENDER_INTERVAL):
+                                answer_box.markdown(acc_text)
+                                rendered_text = acc_text
+                                last_render = now
+                    finally:
+                        stop_reading.set()
 
-                stop_button_placeholder.empty()
-                if stop_pressed:
-                    st.warning("Generation stopped by user.")
-                    # Even if stopped, we might want to save what we have
-                    if acc_text:
-                        # Optional: persist partial message or not?
-                        # User said "durdurup daha sonra yazdığı soruyu devam ettirme"
-                        # This implies we can stop and then edit.
-                        pass
+                # Finished: the Stop callback must not save this answer again.
+                # No st.* call (a rerun yield point) until it is appended.
+                st.session_state.pop(_PARTIAL_KEY, None)
 
                 # Persist assistant message + panels in session history
                 messages.append(
                     {
                         "role": "assistant",
-                        "content": acc_text + (" (Stopped)" if stop_pressed else ""),
+                        "content": acc_text,
                         "reasoning_summary": reasoning_summary,
-                        "tool_events": tool_events,
-                        "debug_events": debug_events,
+                        "tool_events": tool_events[-TOOL_EVENTS_KEPT:],
+                        "debug_events": debug_events[-DEBUG_EVENTS_KEPT:],
                     }
                 )
                 st.session_state[key] = messages
+                invalidate_history(user_id, chat_id)
                 st.session_state.streaming = False
+                stop_button_placeholder.empty()
                 st.rerun()
 
             else:
                 # Fallback sync endpoint
                 with st.spinner("Thinking..."):
-                    r = requests.post(f"{API_BASE}/agent/chat", json=payload, timeout=300)
+                    r = _http().post(f"{API_BASE}/agent/chat", json=payload, timeout=300)
                 r.raise_for_status()
-                data = r.json()
+                data = json_loads(r.content)
 
                 acc_text = data.get("response", "")
                 answer_box.markdown(acc_text)
@@ -417,11 +699,12 @@ if prompt or edit_triggered_prompt:
                         "role": "assistant",
                         "content": acc_text,
                         "reasoning_summary": reasoning_summary,
-                        "tool_events": tool_events,
-                        "debug_events": debug_events,
+                        "tool_events": tool_events[-TOOL_EVENTS_KEPT:],
+                        "debug_events": debug_events[-DEBUG_EVENTS_KEPT:],
                     }
                 )
                 st.session_state[key] = messages
+                invalidate_history(user_id, chat_id)
 
         except Exception as e:
             st.error(f"Request failed: {e}")
\ No newline at end of file
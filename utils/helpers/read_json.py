@@ -1,26 +1,36 @@
-import json
+from functools import lru_cache
 from pathlib import Path
 
+import orjson
+
+PROMPTS_PATH = Path(__file__).parent.parent / "static" / "system_prompts.json"
+
+# Used when the prompts file is missing or unreadable
+DEFAULT_PROMPTS = {
+    "code_interpreter": "You are a helpful AI assistant.",
+    "writer": "You are a writer assistant.",
+    "general_assistant": "You are a helpful AI assistant."
+}
+
+
+@lru_cache(maxsize=4)
+def _load_prompts_file(path: str, mtime: float) -> dict:
+    # mtime is part of the cache key, so an edited file is parsed again
+    with open(path, "rb") as f:
+        return orjson.loads(f.read())
+
+
 # System Prompts Loader
 def load_system_prompts() -> dict:
-    """Load system prompts from JSON file."""
-    prompts_path = Path(__file__).parent.parent / "static" / "system_prompts.json"
-
-    if not prompts_path.exists():
+    """Load system prompts from JSON file (parsed once per file version)."""
+    try:
+        mtime = PROMPTS_PATH.stat().st_mtime
+    except FileNotFoundError:
         # Fallback to default prompts if file doesn't exist
-        return {
-            "code_interpreter": "You are a helpful AI assistant.",
-            "writer": "You are a writer assistant.",
-            "general_assistant": "You are a helpful AI assistant."
-        }
+        return dict(DEFAULT_PROMPTS)
 
     try:
-        with open(prompts_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return dict(_load_prompts_file(str(PROMPTS_PATH), mtime))
     except Exception as e:
         print(f"Warning: Could not load system prompts: {e}")
-        return {
-            "code_interpreter": "You are a helpful AI assistant.",
-            "writer": "You are a writer assistant.",
-            "general_assistant": "You are a helpful AI assistant."
-        }
\ No newline at end of file
+        return dict(DEFAULT_PROMPTS)
@@ -0,0 +1,59 @@
+from langsmith import traceable
+
+from utils.settings import LANGCHAIN_TRACING_V2
+
+
+def _identity(func):
+    return func
+
+
+def maybe_traceable(**kwargs):
+    """
+    Apply LangSmith @traceable only when tracing is enabled.
+
+    The decision is made once at import time, so with tracing off the
+    decorated function is returned untouched and calls carry no tracer
+    overhead.
+    """
+    if LANGCHAIN_TRACING_V2:
+        return traceable(**kwargs)
+    return _identity
+
+
+# ==================== Background Tracing ====================
+
+
+def _describe(value, limit: int = 2000):
+    """Cheap, JSON-safe description of an arbitrary object"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def _describe_inputs(inputs: dict) -> dict:
+    return {key: _describe(value) for key, value in inputs.items()}
+
+
+def _describe_output(output) -> dict:
+    return {"output": _describe(output)}
+
+
+def background_traceable(name: str, tags: list = None):
+    """
+    Trace a function to LangSmith without serializing on the call path.
+
+    A LangSmith @traceable whose inputs and outputs are reduced to short
+    descriptions up front, so large objects (agents, graphs) are never
+    serialized. Runs are queued to the LangSmith client's background
+    batching thread, which flushes what is left at interpreter exit.
+    """
+    if not LANGCHAIN_TRACING_V2:
+        return _identity
+
+    return traceable(
+        name=name,
+        tags=list(tags or []),
+        process_inputs=_describe_inputs,
+        process_outputs=_describe_output,
+    )
@@ -1,45 +1,143 @@
+import functools
 import os
+from dataclasses import dataclass
 from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping, Optional
 from dotenv import load_dotenv
 
 from utils.helpers.read_json import load_system_prompts
 
-load_dotenv()
-
-DB_USER = os.getenv("DB_USER", "")
-DB_PWD = os.getenv("DB_PWD", "")
-DB_HOST = os.getenv("DB_HOST", "")
-DB_DB_NAME = os.getenv("DB_DB_NAME", "")
-
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-# LangSmith Configuration
-LANGCHAIN_TRACING_V2 = os.getenv("LANGCHAIN_TRACING_V2", "false").lower() == "true"
-LANGCHAIN_API_KEY = os.getenv("LANGCHAIN_API_KEY")
-LANGCHAIN_PROJECT = os.getenv("LANGCHAIN_PROJECT", "lang-chain-mc")
-LANGCHAIN_ENDPOINT = os.getenv("LANGCHAIN_ENDPOINT", "https://api.smith.langchain.com")
-
-# Set environment variables for LangSmith if tracing is enabled
-if LANGCHAIN_TRACING_V2 and LANGCHAIN_API_KEY:
-    os.environ["LANGCHAIN_TRACING_V2"] = "true"
-    os.environ["LANGCHAIN_API_KEY"] = LANGCHAIN_API_KEY
-    os.environ["LANGCHAIN_PROJECT"] = LANGCHAIN_PROJECT
-    os.environ["LANGCHAIN_ENDPOINT"] = LANGCHAIN_ENDPOINT
-
-# Load prompts at module import
-SYSTEM_PROMPTS = load_system_prompts()
-
-# Sandbox Configuration
-SANDBOX_TIMEOUT = int(os.getenv("SANDBOX_TIMEOUT", "30"))
-SANDBOX_MAX_OUTPUT = int(os.getenv("SANDBOX_MAX_OUTPUT", "5000"))
-SANDBOX_MEMORY_LIMIT = os.getenv("SANDBOX_MEMORY_LIMIT", "512m")
-SANDBOX_CPU_QUOTA = int(os.getenv("SANDBOX_CPU_QUOTA", "50000"))  # 50% CPU
-SANDBOX_NETWORK_DISABLED = os.getenv("SANDBOX_NETWORK_DISABLED", "true").lower() == "true"
-
-# Workspace
-WORKSPACE_DIR = Path(__file__).parent.parent / "workspace"
-WORKSPACE_DIR.mkdir(exist_ok=True)
-API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Process-wide configuration, read from the environment once"""
+
+    DB_USER: str
+    DB_PWD: str
+    DB_HOST: str
+    DB_DB_NAME: str
+
+    OPENROUTER_API_KEY: Optional[str]
+    TAVILY_API_KEY: Optional[str]
+    OPENROUTER_BASE_URL: str
+    DATABASE_URL: Optional[str]
+
+    # Database connection pool (non-SQLite databases)
+    DB_POOL_SIZE: int
+    DB_MAX_OVERFLOW: int
+    DB_POOL_RECYCLE: int  # seconds
+
+    # LangSmith Configuration
+    LANGCHAIN_TRACING_V2: bool
+    LANGCHAIN_API_KEY: Optional[str]
+    LANGCHAIN_PROJECT: str
+    LANGCHAIN_ENDPOINT: str
+
+    # Read-only view of static/system_prompts.json
+    SYSTEM_PROMPTS: Mapping[str, str]
+
+    # Sandbox Configuration
+    SANDBOX_TIMEOUT: int
+    SANDBOX_MAX_OUTPUT: int
+    SANDBOX_MEMORY_LIMIT: str
+    SANDBOX_CPU_QUOTA: int  # 50000 = 50% CPU
+    SANDBOX_NETWORK_DISABLED: bool
+    # Idle warm sandbox containers, one per session (0 = one container per run)
+    SANDBOX_POOL_SIZE: int
+    SANDBOX_POOL_MAX_USES: int  # recycle after N runs
+
+    # Workspace
+    WORKSPACE_DIR: Path
+    API_BASE_URL: str
+
+
+def _export_langsmith_env(settings: Settings) -> None:
+    """Expose the LangSmith settings to the SDK, without overriding values already set"""
+    if not (settings.LANGCHAIN_TRACING_V2 and settings.LANGCHAIN_API_KEY):
+        return
+    os.environ.setdefault("LANGCHAIN_TRACING_V2", "true")
+    os.environ.setdefault("LANGCHAIN_API_KEY", settings.LANGCHAIN_API_KEY)
+    os.environ.setdefault("LANGCHAIN_PROJECT", settings.LANGCHAIN_PROJECT)
+    os.environ.setdefault("LANGCHAIN_ENDPOINT", settings.LANGCHAIN_ENDPOINT)
+
+
+# Optional local overrides; containers usually configure through the environment
+ENV_FILE = Path(__file__).parent.parent / ".env"
+
+
+@functools.cache
+def get_settings() -> Settings:
+    """Build the settings on first call; later calls return the same object"""
+    # One stat instead of load_dotenv's upward directory search when there is no file
+    if ENV_FILE.is_file():
+        load_dotenv(ENV_FILE)
+    env = dict(os.environ)
+
+    settings = Settings(
+        DB_USER=env.get("DB_USER", ""),
+        DB_PWD=env.get("DB_PWD", ""),
+        DB_HOST=env.get("DB_HOST", ""),
+        DB_DB_NAME=env.get("DB_DB_NAME", ""),
+        OPENROUTER_API_KEY=env.get("OPENROUTER_API_KEY"),
+        TAVILY_API_KEY=env.get("TAVILY_API_KEY"),
+        OPENROUTER_BASE_URL="https://openrouter.ai/api/v1",
+        DATABASE_URL=env.get("DATABASE_URL"),
+        DB_POOL_SIZE=int(env.get("DB_POOL_SIZE", "10")),
+        DB_MAX_OVERFLOW=int(env.get("DB_MAX_OVERFLOW", "20")),
+        DB_POOL_RECYCLE=int(env.get("DB_POOL_RECYCLE", "1800")),
+        LANGCHAIN_TRACING_V2=env.get("LANGCHAIN_TRACING_V2", "false").lower() == "true",
+        LANGCHAIN_API_KEY=env.get("LANGCHAIN_API_KEY"),
+        LANGCHAIN_PROJECT=env.get("LANGCHAIN_PROJECT", "lang-chain-mc"),
+        LANGCHAIN_ENDPOINT=env.get("LANGCHAIN_ENDPOINT", "https://api.smith.langchain.com"),
+        SYSTEM_PROMPTS=MappingProxyType(load_system_prompts()),
+        SANDBOX_TIMEOUT=int(env.get("SANDBOX_TIMEOUT", "30")),
+        SANDBOX_MAX_OUTPUT=int(env.get("SANDBOX_MAX_OUTPUT", "5000")),
+        SANDBOX_MEMORY_LIMIT=env.get("SANDBOX_MEMORY_LIMIT", "512m"),
+        SANDBOX_CPU_QUOTA=int(env.get("SANDBOX_CPU_QUOTA", "50000")),
+        SANDBOX_NETWORK_DISABLED=env.get("SANDBOX_NETWORK_DISABLED", "true").lower() == "true",
+        SANDBOX_POOL_SIZE=int(env.get("SANDBOX_POOL_SIZE", "0")),
+        SANDBOX_POOL_MAX_USES=int(env.get("SANDBOX_POOL_MAX_USES", "50")),
+        WORKSPACE_DIR=Path(__file__).parent.parent / "workspace",
+        API_BASE_URL=env.get("API_BASE_URL", "http://localhost:8000"),
+    )
+
+    _export_langsmith_env(settings)
+    settings.WORKSPACE_DIR.mkdir(exist_ok=True)
+    return settings
+
+
+SETTINGS = get_settings()
+
+# Module-level names kept for existing `from utils.settings import X` imports
+DB_USER = SETTINGS.DB_USER
+DB_PWD = SETTINGS.DB_PWD
+DB_HOST = SETTINGS.DB_HOST
+DB_DB_NAME = SETTINGS.DB_DB_NAME
+
+OPENROUTER_API_KEY = SETTINGS.OPENROUTER_API_KEY
+TAVILY_API_KEY = SETTINGS.TAVILY_API_KEY
+OPENROUTER_BASE_URL = SETTINGS.OPENROUTER_BASE_URL
+DATABASE_URL = SETTINGS.DATABASE_URL
+
+DB_POOL_SIZE = SETTINGS.DB_POOL_SIZE
+DB_MAX_OVERFLOW = SETTINGS.DB_MAX_OVERFLOW
+DB_POOL_RECYCLE = SETTINGS.DB_POOL_RECYCLE
+
+LANGCHAIN_TRACING_V2 = SETTINGS.LANGCHAIN_TRACING_V2
+LANGCHAIN_API_KEY = SETTINGS.LANGCHAIN_API_KEY
+LANGCHAIN_PROJECT = SETTINGS.LANGCHAIN_PROJECT
+LANGCHAIN_ENDPOINT = SETTINGS.LANGCHAIN_ENDPOINT
+
+SYSTEM_PROMPTS = SETTINGS.SYSTEM_PROMPTS
+
+SANDBOX_TIMEOUT = SETTINGS.SANDBOX_TIMEOUT
+SANDBOX_MAX_OUTPUT = SETTINGS.SANDBOX_MAX_OUTPUT
+SANDBOX_MEMORY_LIMIT = SETTINGS.SANDBOX_MEMORY_LIMIT
+SANDBOX_CPU_QUOTA = SETTINGS.SANDBOX_CPU_QUOTA
+SANDBOX_NETWORK_DISABLED = SETTINGS.SANDBOX_NETWORK_DISABLED
+SANDBOX_POOL_SIZE = SETTINGS.SANDBOX_POOL_SIZE
+SANDBOX_POOL_MAX_USES = SETTINGS.SANDBOX_POOL_MAX_USES
+
+WORKSPACE_DIR = SETTINGS.WORKSPACE_DIR
+API_BASE_URL = SETTINGS.API_BASE_URL